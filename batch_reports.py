@@ -0,0 +1,77 @@
+# batch_reports.py
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataset import Dataset
+from storage import SQLiteStorage, ExcelStorage
+from reports import build_table_data, write_pdf, write_excel
+
+
+def safe_name(flotta):
+    return re.sub(r'[\\/:*?"<>|\[\]]+', "_", str(flotta)).strip() or "FLOTTA"
+
+
+def render_fleet(flotta, results, output_dir):
+    name = safe_name(flotta)
+    start = time.perf_counter()
+    table_data = build_table_data(results)
+    total_targa = len(results["TARGA"].unique())
+    table_time = time.perf_counter()
+    write_pdf(os.path.join(output_dir, f"{name}.pdf"), flotta, table_data, total_targa)
+    pdf_time = time.perf_counter()
+    write_excel(os.path.join(output_dir, f"{name}.xlsx"), flotta, table_data, sheet_name=name[:31])
+    excel_time = time.perf_counter()
+    return {
+        "flotta": flotta,
+        "rows": len(results),
+        "table": table_time - start,
+        "pdf": pdf_time - table_time,
+        "excel": excel_time - pdf_time,
+    }
+
+
+def open_dataset(data_path, journal_path):
+    # Read-only, the app or the data server may be writing to the same files
+    if data_path.endswith(".xlsx"):
+        return Dataset.snapshot(ExcelStorage(data_path))
+    return Dataset.snapshot(SQLiteStorage(data_path, read_only=True), journal_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the PDF and Excel flow report of every FLOTTA")
+    parser.add_argument("--data", default="data.db", help="data.db or a data.xlsx export")
+    parser.add_argument("--journal", default="data.journal")
+    parser.add_argument("--output", default="reports")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    if not os.path.exists(args.data):
+        parser.error(f"{args.data} not found")
+
+    start = time.perf_counter()
+    df = open_dataset(args.data, args.journal).frame()
+    load_time = time.perf_counter() - start
+    os.makedirs(args.output, exist_ok=True)
+
+    # Only ship the columns the report needs to the worker processes
+    fleets = df[["FLOTTA", "TARGA", "STATO"]].dropna(subset=["FLOTTA"]).groupby("FLOTTA", sort=True, observed=True)
+
+    timings = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(render_fleet, flotta, results, args.output): flotta for flotta, results in fleets}
+        for future in as_completed(futures):
+            try:
+                timings.append(future.result())
+            except Exception as e:
+                print(f"{futures[future]}: failed ({e})")
+
+    print(f"Loaded {len(df)} rows in {load_time:.2f}s")
+    print(f"{'FLOTTA':<30}{'ROWS':>8}{'TABLE':>10}{'PDF':>10}{'EXCEL':>10}")
+    for timing in sorted(timings, key=lambda t: t["flotta"]):
+        print(f"{str(timing['flotta']):<30}{timing['rows']:>8}{timing['table']:>10.3f}{timing['pdf']:>10.3f}{timing['excel']:>10.3f}")
+    print(f"{len(timings)} fleets written to {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
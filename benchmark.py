@@ -0,0 +1,241 @@
+# benchmark.py
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+import numpy as np
+import pandas as pd
+from dataset import Dataset
+from storage import SQLiteStorage
+from journal import Journal
+from recompute import recompute_derived
+from reports import build_table_data
+from schema import COLUMNS, GUI_LABELS, RICAMBI_VALUES, STATO_VALUES, apply_schema, storage_frame, storage_records
+import service
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+# openpyxl needs minutes for a million-row workbook, skip full exports above this size by default
+MAX_EXPORT_ROWS = 100_000
+
+FLEETS = [
+    "AYVENS", "ARVAL", "LEASYS", "ALPHABET", "HERTZ", "AVIS", "EUROPCAR", "SIXT",
+    "LEASEPLAN", "VOLKSWAGEN LEASING", "FREE2MOVE", "UNIPOLRENTAL", "DRIVALIA", "ATHLON",
+] + [f"FLOTTA {i:03d}" for i in range(1, 67)]
+WORKSHOPS = ["ROSSI", "BIANCHI", "FERRARI", "ESPOSITO", "ROMANO", "COLOMBO", "RICCI", "MARINO"]
+MODELS = ["FIAT 500", "FIAT PANDA", "VW GOLF", "RENAULT CLIO", "TOYOTA YARIS", "JEEP RENEGADE", "PEUGEOT 208", "BMW X1"]
+
+# Finished vehicles pile up, the working states hold a thin slice of the workshop
+STATO_WEIGHTS = [3, 2, 6, 3, 3, 2, 1, 4, 4, 2, 20, 45, 5]
+# Which phase dates a vehicle in each STATO already has: INIZIO.MECC, FINE MECC, INIZIO CARR, FINE CARR
+STATO_PHASES = {
+    "ATT.PERZ.": 0, "ATT.AUT.": 0, "ATT.RIC.": 0, "LAV.MECC.": 1,
+    "LAV.CAR1": 3, "LAV.CAR2": 3, "LAV.CAR3": 3, "LAV.CAR4": 3,
+    "FIN": 4, "ALTRI LAVORI": 4, "DA FATTURARE": 4, "PRONTA": 4, "PRE-CONSEGNA": 4,
+}
+
+
+def weighted_choice(rng, values, weights, size):
+    weights = np.asarray(weights, dtype=float)
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+
+def random_plates(rng, size):
+    letters = np.array(list("ABCDEFGHJKLMNPRSTVWXYZ"))
+    codes = rng.choice(len(letters) ** 4 * 1000, size=size, replace=False)
+    codes, digits = np.divmod(codes, 1000)
+    parts = []
+    for _ in range(4):
+        codes, letter = np.divmod(codes, len(letters))
+        parts.append(letters[letter])
+    return pd.Series(parts[0]) + parts[1] + pd.Series(digits).astype(str).str.zfill(3) + parts[2] + parts[3]
+
+
+def generate_workshop(rows, seed=0, today=None):
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(today or date.today(), "D")
+
+    # Fleet sizes follow a Zipf-like curve: a handful of lessors own most of the cars
+    fleet_weights = 1.0 / np.arange(1, len(FLEETS) + 1) ** 1.1
+    stato = weighted_choice(rng, STATO_VALUES, STATO_WEIGHTS, rows)
+    phases = pd.Series(stato).map(STATO_PHASES).to_numpy()
+    pz_carr = rng.integers(0, 9, rows)
+
+    entrata = today - rng.integers(0, 730, rows).astype("timedelta64[D]")
+    inizio_mecc = entrata + rng.integers(0, 6, rows).astype("timedelta64[D]")
+    fine_mecc = inizio_mecc + rng.integers(1, 8, rows).astype("timedelta64[D]")
+    inizio_carr = fine_mecc + rng.integers(0, 4, rows).astype("timedelta64[D]")
+    fine_carr = inizio_carr + rng.integers(1, 12, rows).astype("timedelta64[D]")
+    has_carr = pz_carr > 0
+
+    def dated(dates, filled):
+        return pd.Series(dates).where(filled)
+
+    df = pd.DataFrame({
+        "FLOTTA": weighted_choice(rng, FLEETS, fleet_weights, rows),
+        "TARGA": random_plates(rng, rows),
+        "MODELLO": weighted_choice(rng, MODELS, np.ones(len(MODELS)), rows),
+        "ENTRATA": dated(entrata, np.ones(rows, dtype=bool)),
+        "PREV.USCITA": dated(entrata + np.timedelta64(10, "D"), np.ones(rows, dtype=bool)),
+        "DITTA": weighted_choice(rng, WORKSHOPS, np.arange(len(WORKSHOPS), 0, -1), rows),
+        "INIZIO.MECC": dated(inizio_mecc, phases >= 1),
+        "FINE MECC": dated(fine_mecc, phases >= 2),
+        "INIZIO CARR": dated(inizio_carr, (phases >= 3) & has_carr),
+        "FINE CARR": dated(fine_carr, (phases >= 4) & has_carr),
+        "PZ CARR": pd.array(np.where(has_carr, pz_carr, 0), dtype="Int64"),
+        "STATO": stato,
+        "RICAMBI": weighted_choice(rng, RICAMBI_VALUES, [1, 3], rows),
+    }).reindex(columns=COLUMNS)
+    return recompute_derived(apply_schema(df))
+
+
+def measure(operation, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        operation(i)
+        timings.append(time.perf_counter() - start)
+
+    # A separate traced run, tracemalloc slows the code down too much to time it
+    tracemalloc.start()
+    operation(repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "min_s": round(min(timings), 6),
+        "median_s": round(statistics.median(timings), 6),
+        "peak_mb": round(peak / 2 ** 20, 3),
+    }
+
+
+def benchmark_size(rows, repeat, seed, operations, workdir, max_export_rows=MAX_EXPORT_ROWS):
+    df = generate_workshop(rows, seed)
+    db_path = os.path.join(workdir, f"bench_{rows}.db")
+    journal_path = os.path.join(workdir, f"bench_{rows}.journal")
+    storage = SQLiteStorage(db_path)
+    storage.apply(df, [{"op": "insert_many", "rows": storage_records(df)}])
+    dataset = Dataset(storage, Journal(journal_path))
+    dataset.frame()
+
+    fleet_sizes = df["FLOTTA"].value_counts()
+    median_fleet = fleet_sizes.index[len(fleet_sizes) // 2]
+    largest_fleet = fleet_sizes.index[0]
+    sample = storage_frame(df.sample(n=repeat + 1, random_state=seed))
+    new_rows = storage_frame(generate_workshop(repeat + 1, seed + 1))
+
+    def load(i):
+        Dataset(SQLiteStorage(db_path)).frame()
+
+    def search_targa(i):
+        service.search_vehicles(dataset, "TARGA", sample["TARGA"].iloc[i][2:5])
+
+    def search_flotta(i):
+        service.search_vehicles(dataset, "FLOTTA", largest_fleet[:3])
+
+    def insert(i):
+        row = service.new_vehicle_row(new_rows.iloc[i][GUI_LABELS].to_dict())
+        service.insert_vehicle(dataset, row)
+
+    def update(i):
+        row = sample.iloc[i]
+        values = {col: row[col] if pd.notna(row[col]) else "" for col in ["ENTRATA", "INIZIO.MECC", "FINE MECC", "INIZIO CARR", "FINE CARR", "PZ CARR"]}
+        values["STATO"] = "PRONTA"
+        service.update_vehicle(dataset, row["TARGA"], row["ENTRATA"], service.edited_values(values, dataset.calendar))
+
+    def recompute(i):
+        recompute_derived(dataset.frame(), dataset.calendar)
+
+    def fleet_table(i):
+        build_table_data(df[df["FLOTTA"] == largest_fleet])
+
+    def fleet_report(i):
+        results, table_data = service.fleet_report(dataset, median_fleet)
+        service.export_fleet_report(median_fleet, results, table_data,
+                                    os.path.join(workdir, "report.pdf"), os.path.join(workdir, "report.xlsx"))
+
+    def compact(i):
+        dataset.compact()
+
+    def export_excel(i):
+        dataset.export_excel(os.path.join(workdir, "export.xlsx"))
+
+    available = {
+        "load": load,
+        "build_indexes": lambda i: dataset.build_indexes(rebuild=True),
+        "search_targa": search_targa,
+        "search_flotta": search_flotta,
+        "insert": insert,
+        "update": update,
+        "compact": compact,
+        "recompute": recompute,
+        "fleet_table": fleet_table,
+        "fleet_report": fleet_report,
+        "export_excel": export_excel,
+    }
+    if operations is None:
+        operations = [name for name in available if name != "export_excel" or rows <= max_export_rows]
+
+    results = {}
+    for name in operations:
+        print(f"  {rows:>9} {name:<15}", end="", flush=True)
+        results[name] = measure(available[name], repeat)
+        print(f"{results[name]['median_s']:>10.4f}s {results[name]['peak_mb']:>10.1f}MB")
+    dataset.close()
+    return results
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"{'ROWS':>9} {'OPERATION':<15}{'BEFORE':>10}{'AFTER':>10}{'RATIO':>8}")
+    for rows, operations in report["results"].items():
+        for name, result in operations.items():
+            before = baseline.get(rows, {}).get(name)
+            if before is None:
+                continue
+            ratio = result["median_s"] / before["median_s"] if before["median_s"] else float("nan")
+            print(f"{rows:>9} {name:<15}{before['median_s']:>10.4f}{result['median_s']:>10.4f}{ratio:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and measure peak memory of the data operations on synthetic workshops")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--operations", nargs="+", help="Subset of operations to run")
+    parser.add_argument("--max-export-rows", type=int, default=MAX_EXPORT_ROWS)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="Previous benchmark.json to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.sizes:
+            report["results"][str(rows)] = benchmark_size(rows, args.repeat, args.seed, args.operations, workdir, args.max_export_rows)
+
+    # Sorted keys and fixed rounding keep two reports diffable line by line
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# bulk_import.py
+import pandas as pd
+from schema import COLUMNS, KEY_COLUMNS, apply_schema, parse_dates, storage_records
+from service import served
+from timing import timed
+
+TEXT_COLUMNS = ["FLOTTA", "TARGA", "MODELLO", "DITTA", "STATO", "RICAMBI"]
+REJECT_COLUMNS = ["RIGA", "TARGA", "ENTRATA", "MOTIVO"]
+
+
+def read_vehicles(path):
+    if path.lower().endswith(".csv"):
+        # Fleet managers send both ; and , separated files
+        df = pd.read_csv(path, dtype=str, sep=None, engine="python")
+    else:
+        df = pd.read_excel(path, dtype=str)
+    df.columns = df.columns.str.strip().str.upper()
+    return df
+
+
+def normalize_vehicles(df):
+    df = df.reindex(columns=COLUMNS).astype(object)
+    for col in TEXT_COLUMNS:
+        text = df[col].str.strip().str.upper()
+        df[col] = text.where(text != "")
+
+    # dd/mm/yyyy as typed in the app, with a fallback for real Excel dates read as text
+    entrata_text = df["ENTRATA"].str.strip()
+    invalid_entrata = entrata_text.notna() & (entrata_text != "") & parse_dates(entrata_text).isna()
+    df = apply_schema(df)
+    df["PREV.USCITA"] = df["ENTRATA"] + pd.Timedelta(days=10)
+    return df, invalid_entrata
+
+
+def split_duplicates(df, existing):
+    keys = pd.MultiIndex.from_frame(df[KEY_COLUMNS])
+    in_existing = keys.isin(pd.MultiIndex.from_frame(existing[KEY_COLUMNS]))
+    in_file = keys.duplicated(keep="first")
+    return in_existing, in_file
+
+
+@timed("import_vehicles")
+@served
+def import_vehicles(dataset, path):
+    raw = read_vehicles(path)
+    df, invalid_entrata = normalize_vehicles(raw)
+    in_existing, in_file = split_duplicates(df, dataset.frame())
+
+    reasons = pd.Series(None, index=df.index, dtype=object)
+    reasons[in_file] = "DUPLICATO NEL FILE"
+    reasons[in_existing] = "GIÀ PRESENTE"
+    reasons[invalid_entrata] = "ENTRATA NON VALIDA"
+    reasons[df["TARGA"].isna()] = "TARGA MANCANTE"
+
+    rejected = pd.DataFrame({
+        "RIGA": df.index + 2,  # Spreadsheet row, after the header
+        "TARGA": raw.get("TARGA"),
+        "ENTRATA": raw.get("ENTRATA"),
+        "MOTIVO": reasons,
+    })[reasons.notna()]
+
+    accepted = df[reasons.isna()]
+    if not accepted.empty:
+        dataset.insert_many(storage_records(accepted))
+    return len(accepted), rejected.reindex(columns=REJECT_COLUMNS)
@@ -0,0 +1,64 @@
+# dashboard.py
+import tkinter as tk
+from virtual_tree import VirtualTreeview
+from kpi import KPI_COLUMNS, KPI_DIMENSIONS, kpi_table
+from service import stato_history
+from tasks import StatusBar, TaskRunner
+
+HISTORY_ANALYSES = [
+    ("Tempo in STATO", "time_in_state"),
+    ("Code per STATO", "queues"),
+    ("Uscite settimanali", "throughput"),
+]
+
+class FleetDashboardApp:
+    def __init__(self, root, dataset):
+        self.root = root
+        self.root.title("Cruscotto Flotte")
+        self.root.geometry("1000x500")
+        self.dataset = dataset
+
+        control_frame = tk.Frame(self.root)
+        control_frame.pack(pady=10)
+
+        self.dimension = tk.StringVar(value=KPI_DIMENSIONS[0])
+        for dimension in KPI_DIMENSIONS:
+            tk.Radiobutton(control_frame, text=dimension, variable=self.dimension, value=dimension,
+                           command=self.refresh).pack(side=tk.LEFT, padx=10)
+        tk.Button(control_frame, text="Aggiorna", command=self.refresh).pack(side=tk.LEFT, padx=10)
+
+        self.kpi_view = VirtualTreeview(self.root, KPI_COLUMNS)
+        self.kpi_view.pack(fill=tk.BOTH, expand=True)
+
+        history_frame = tk.Frame(self.root)
+        history_frame.pack(pady=10)
+        for title, analysis in HISTORY_ANALYSES:
+            tk.Button(history_frame, text=title, command=lambda title=title, analysis=analysis: self.show_history(title, analysis)).pack(
+                side=tk.LEFT, padx=10)
+
+        self.status_bar = StatusBar(self.root)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tasks = TaskRunner(self.root, self.status_bar)
+        self.refresh()
+
+    def refresh(self):
+        # Reads the maintained aggregate only, never the vehicles, but a thin client still has to ask the server
+        self.tasks.submit("kpi", self.kpi_rows, self.dimension.get(), on_done=self.kpi_view.set_rows,
+                          message="Aggiornamento KPI...", supersede=True)
+
+    def kpi_rows(self, dimension):
+        return kpi_table(self.dataset.kpi, dimension)
+
+    def show_history(self, title, analysis):
+        by = self.dimension.get()
+        self.tasks.submit("history", stato_history, self.dataset, analysis, by,
+                          on_done=lambda table: self.show_table(f"{title} per {by}", table), message="Analisi storico STATO...")
+
+    def show_table(self, title, table):
+        table.columns = table.columns.astype(str)
+        table_window = tk.Toplevel(self.root)
+        table_window.title(title)
+        table_window.geometry("900x400")
+        table_view = VirtualTreeview(table_window, list(table.columns))
+        table_view.pack(fill=tk.BOTH, expand=True)
+        table_view.set_rows(table)
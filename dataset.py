@@ -0,0 +1,488 @@
+# dataset.py
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+from recompute import DERIVED_COLUMNS, italian_calendar, recompute_derived
+from schema import (
+    DATE_COLUMNS, KEY_COLUMNS, apply_schema, concat_frames, parse_dates, set_values, storage_frame, storage_records,
+    to_storage_row, unreadable_cells,
+)
+from search_index import SubstringIndex
+from sidecar import read_workbook, write_workbook
+from timing import timed
+from kpi import add_kpi, kpi_contribution, kpi_delta, sum_kpi
+from journal import read_records
+from stato_history import EVENT_COLUMNS, event_frame, key_changes, rekey_events, stato_events
+
+COMPACT_INTERVAL = 5
+COMPACT_BATCH_SIZE = 500
+SEARCH_COLUMNS = ["TARGA", "FLOTTA"]
+
+logger = logging.getLogger("dataset")
+
+
+class VersionConflict(Exception):
+    pass
+
+
+def key_labels(df, keys):
+    # Row label of each (TARGA, ENTRATA) key, NaN where the key is missing
+    wanted = pd.DataFrame(list(keys), columns=KEY_COLUMNS)
+    wanted["ENTRATA"] = parse_dates(wanted["ENTRATA"])
+    present = df[KEY_COLUMNS].assign(LABEL=df.index).dropna(subset=KEY_COLUMNS).drop_duplicates(KEY_COLUMNS)
+    return wanted.merge(present, on=KEY_COLUMNS, how="left")["LABEL"]
+
+
+def key_map(df):
+    # (TARGA, typed ENTRATA) -> row label, the first row wins where a legacy store holds a key twice
+    keys = df[KEY_COLUMNS].dropna()
+    keys = keys[~keys.duplicated()]
+    return dict(zip(zip(keys["TARGA"].astype(object), keys["ENTRATA"]), keys.index))
+
+
+def map_keys(keys, key_to_label):
+    # Storage keys to row labels, None where the key is missing
+    keys = list(keys)
+    entrate = parse_dates(pd.Series([key[1] for key in keys], dtype=object))
+    return [key_to_label.get((key[0], entrata)) for key, entrata in zip(keys, entrate)]
+
+
+def row_key(rows, label):
+    key = (rows.at[label, "TARGA"], rows.at[label, "ENTRATA"])
+    return None if pd.isna(key[0]) or pd.isna(key[1]) else key
+
+
+def apply_change(df, change, key_to_label):
+    # Changes carry storage values, they are typed here before touching the frame.
+    # Updates are written in place, inserts append; key_to_label follows and the touched rows come back before and after
+    if change["op"] in ("insert", "insert_many"):
+        rows = change["rows"] if change["op"] == "insert_many" else [change["row"]]
+        new_df = apply_schema(pd.DataFrame(rows))
+        # Replaying a journal after a crash may meet rows that already reached the store
+        keys = list(zip(new_df["TARGA"].astype(object), new_df["ENTRATA"]))
+        new_df = new_df[[key not in key_to_label for key in keys]]
+        start = df.index.max() + 1 if len(df) else 0
+        new_df.index = pd.RangeIndex(start, start + len(new_df))
+        for label in new_df.index:
+            key = row_key(new_df, label)
+            if key is not None:
+                key_to_label.setdefault(key, label)
+        df = concat_frames(df, new_df) if len(df) else new_df
+        return df, new_df.iloc[:0], new_df
+    updates = change["updates"] if change["op"] == "update_many" else [change]
+    labels = map_keys([update["key"] for update in updates], key_to_label)
+    hits = [(label, update["values"]) for label, update in zip(labels, updates) if label is not None]
+    index = pd.Index([label for label, _ in hits], dtype="int64")
+    old_rows = df.loc[index]
+    if hits:
+        set_values(df, index, [values for _, values in hits])
+        for label, values in hits:
+            if "TARGA" in values or "ENTRATA" in values:
+                old_key, new_key = row_key(old_rows, label), row_key(df, label)
+                if old_key is not None and key_to_label.get(old_key) == label:
+                    del key_to_label[old_key]
+                if new_key is not None:
+                    key_to_label.setdefault(new_key, label)
+    return df, old_rows, df.loc[index]
+
+
+def changed_rows(old_df, df, columns):
+    changed = pd.Series(False, index=df.index)
+    for col in columns:
+        old, new = old_df[col], df[col]
+        changed |= (old != new).fillna(True).astype(bool) & ~(old.isna() & new.isna())
+    return changed
+
+
+def unreadable_values(stored, typed):
+    # Stored text of every cell the schema could not read, on the rows holding one
+    unreadable = unreadable_cells(stored, typed)
+    rows = unreadable.any(axis=1)
+    values = stored.reindex(columns=unreadable.columns)[rows].where(unreadable[rows])
+    for col in values.columns:
+        found = values[col].dropna()
+        if len(found):
+            examples = [f"{targa} {value!r}" for targa, value in zip(stored.loc[found.index, "TARGA"], found[:5])]
+            logger.warning("%s: %d values could not be read and are kept as stored, e.g. %s", col, len(found), ", ".join(examples))
+    return values
+
+
+def keep_stored_derived(df, typed, unreadable):
+    # Day counts computed from an unreadable date would be blanks, those rows keep the stored ones
+    labels = unreadable.index[unreadable.reindex(columns=DATE_COLUMNS).notna().any(axis=1)]
+    if len(labels):
+        df.loc[labels, DERIVED_COLUMNS] = typed.loc[labels, DERIVED_COLUMNS]
+    return df
+
+
+def _as_text(series):
+    text = series.astype(object).where(series.notna(), "").astype(str)
+    return text.str.replace(r"\.0$", "", regex=True)
+
+
+class Dataset:
+    def __init__(self, storage, journal=None, calendar=None):
+        self.storage = storage
+        self.journal = journal
+        self.calendar = calendar if calendar is not None else italian_calendar()
+        self.lock = threading.RLock()
+        self._df = None
+        self._signature = None
+        self._pending = journal.records() if journal is not None else []
+        # KPI delta of every journaled change, folded into the stored KPI together with the change
+        self._pending_kpi = []
+        # Every journal record is numbered, the store keeps the number of the last one it holds
+        self._seq = 0
+        self.kpi = None
+        self._indexes = {}
+        self._keys = {}
+        self._unreadable = pd.DataFrame()
+        # Edit counter of every updated row, keyed on its stored (TARGA, ENTRATA), for optimistic concurrency.
+        # Each update carries the new counters, the store keeps them in vehicles.VERSIONE
+        self._row_versions = {}
+        # One compaction at a time, always taken before self.lock
+        self._compacting = threading.RLock()
+        # One export at a time, the workbook and its sidecar cache are written together
+        self._exporting = threading.Lock()
+        self._stop = threading.Event()
+        self._compactor = None
+        self.version = 0
+        self.read_only = False
+
+    @classmethod
+    def snapshot(cls, storage, journal_path=None, calendar=None):
+        # For tools running next to the app: the journal is replayed without being opened for append, nothing is written.
+        # It is read before the store, a batch compacted in between is then seen twice rather than lost
+        dataset = cls(storage, calendar=calendar)
+        dataset.read_only = True
+        if journal_path is not None and os.path.exists(journal_path):
+            dataset._pending = read_records(journal_path)
+        return dataset
+
+    def exists(self):
+        return self.storage.exists()
+
+    def frame(self):
+        with self.lock:
+            # Reload only when the data was changed outside the app
+            signature = self.storage.signature()
+            if self._df is None or signature != self._signature:
+                with timed("load"):
+                    with timed("read"):
+                        stored = self.storage.load()
+                    with timed("schema"):
+                        df = apply_schema(stored)
+                        self._unreadable = unreadable_values(stored, df)
+                    with timed("keys"):
+                        self._keys = key_map(df)
+                    with timed("kpi"):
+                        kpi = self.storage.load_kpi()
+                        if kpi is None:
+                            # First start on this store, the only full aggregation it will see
+                            kpi = kpi_contribution(df)
+                            if not self.read_only:
+                                self.storage.save_kpi(kpi)
+                    with timed("replay"):
+                        self._drop_applied()
+                        self._pending_kpi = []
+                        self._row_versions = self._stored_versions()
+                        for change in self._pending:
+                            df, old_rows, new_rows = apply_change(df, change, self._keys)
+                            self._pending_kpi.append(kpi_delta(old_rows, new_rows))
+                            self._apply_versions(change)
+                    with timed("derived"):
+                        self._df = keep_stored_derived(recompute_derived(df, self.calendar), df, self._unreadable)
+                    self._signature = signature
+                    self.kpi = sum_kpi([kpi] + self._pending_kpi)
+                    self._write_back_stale(df, self._df)
+                self._indexes = {}
+            return self._df
+
+    def _drop_applied(self):
+        # A crash between a compaction's commit and its journal truncate leaves that batch in both.
+        # Replaying it would insert again a row whose key it corrected later
+        applied = self.storage.journal_seq()
+        done = 0
+        while done < len(self._pending) and self._pending[done].get("seq", applied + 1) <= applied:
+            done += 1
+        if done:
+            if self.journal is not None and not self.read_only:
+                self.journal.truncate(done)
+            del self._pending[:done]
+        self._seq = max([applied] + [change.get("seq", 0) for change in self._pending])
+
+    def _write_back_stale(self, stored, df):
+        # Stale stored day counts are written like any edit, so the stored KPI keeps matching the stored rows
+        stale = changed_rows(stored, df, DERIVED_COLUMNS)
+        if self.read_only:
+            self.kpi = add_kpi(self.kpi, kpi_delta(stored[stale], df[stale]))
+            return
+        # Rows that can't be addressed by their key are only fixed in memory
+        keyed = stored[KEY_COLUMNS].notna().all(axis=1) & ~stored.duplicated(KEY_COLUMNS, keep=False)
+        self.kpi = add_kpi(self.kpi, kpi_delta(stored[stale & ~keyed], df[stale & ~keyed]))
+        stale &= keyed
+        if not stale.any():
+            return
+        keys = [list(key.values()) for key in storage_records(stored.loc[stale, KEY_COLUMNS])]
+        values = storage_records(df.loc[stale, DERIVED_COLUMNS])
+        change = {"op": "update_many", "updates": [{"key": key, "values": row} for key, row in zip(keys, values)]}
+        delta = kpi_delta(stored[stale], df[stale])
+        self._write(df, change, delta)
+        self.kpi = add_kpi(self.kpi, delta)
+
+    def build_indexes(self, rebuild=False):
+        with self.lock:
+            df = self.frame()
+            for column in SEARCH_COLUMNS:
+                if rebuild or column not in self._indexes:
+                    with timed("build_index"):
+                        self._indexes[column] = SubstringIndex(df[column])
+
+    def search(self, column, term):
+        # Literal, case-insensitive substring match served from an index built on first use
+        with self.lock:
+            df = self.frame()
+            if column not in self._indexes:
+                with timed("build_index"):
+                    self._indexes[column] = SubstringIndex(df[column])
+            with timed("search_index"):
+                labels = self._indexes[column].search(term)
+            with timed("search_select"):
+                return df.loc[labels]
+
+    def labels(self, keys):
+        with self.lock:
+            self.frame()
+            return map_keys(keys, self._keys)
+
+    def find(self, targa, entrata):
+        label = self.labels([(targa, entrata)])[0]
+        return pd.Index([] if label is None else [label], dtype="int64")
+
+    def contains(self, targa, entrata):
+        with timed("check_duplicate"):
+            return not self.find(targa, entrata).empty
+
+    def insert(self, row):
+        with self.lock:
+            if self.contains(row.get("TARGA"), row.get("ENTRATA")):
+                raise ValueError("The combination of TARGA and ENTRATA already exists")
+            self._commit({"op": "insert", "row": to_storage_row(row)})
+
+    def insert_many(self, rows):
+        # One journal record and one store transaction for the whole batch
+        with self.lock:
+            self._commit({"op": "insert_many", "rows": [to_storage_row(row) for row in rows]})
+
+    def row_versions(self, rows):
+        # 0 until a row is first updated
+        versions = pd.Series(0, index=rows.index, dtype="int64")
+        with self.lock:
+            if self._row_versions:
+                labels = key_labels(rows, self._row_versions)
+                found = labels.notna().to_numpy()
+                versions.loc[labels[found].astype(int)] = np.array(list(self._row_versions.values()))[found]
+        return versions
+
+    def _check_versions(self, keys, versions):
+        # A client that read an older version of a row must not overwrite what someone else saved since
+        for key, version in zip(keys, versions):
+            if version is not None and self._row_versions.get(tuple(key), 0) != version:
+                raise VersionConflict(f"{key[0]} {key[1]} was changed by another user, search it again")
+
+    def update(self, index, values, version=None):
+        with self.lock:
+            df = self.frame()
+            key = list(to_storage_row(df.loc[index, KEY_COLUMNS]).values())
+            self._check_versions([key], [version])
+            self._commit({"op": "update", "key": key, "values": to_storage_row(values)})
+            self._forget_unreadable([index], [values])
+
+    def update_many(self, labels, rows, versions=None):
+        # A batch of edits is one journal record and one store transaction, a single stale row rejects it all
+        with self.lock:
+            df = self.frame()
+            keys = [list(to_storage_row(row).values()) for row in df.loc[labels, KEY_COLUMNS].to_dict("records")]
+            if versions is not None:
+                self._check_versions(keys, versions)
+            updates = [{"key": key, "values": to_storage_row(values)} for key, values in zip(keys, rows)]
+            self._commit({"op": "update_many", "updates": updates})
+            self._forget_unreadable(labels, rows)
+
+    def _forget_unreadable(self, labels, rows):
+        # A saved edit replaces the stored text, a blank included
+        for label, values in zip(labels, rows):
+            if label in self._unreadable.index:
+                self._unreadable.loc[label, [col for col in values if col in self._unreadable.columns]] = None
+
+    def _commit(self, change):
+        df = self.frame()
+        if change["op"] in ("update", "update_many"):
+            change = {**change, "versions": self._next_versions(change)}
+        try:
+            with timed("apply"):
+                df, old_rows, new_rows = apply_change(df, change, self._keys)
+                self._update_indexes(old_rows, new_rows)
+            with timed("kpi"):
+                delta = kpi_delta(old_rows, new_rows)
+            events = stato_events(old_rows, new_rows)
+            if events:
+                change = {**change, "events": events}
+            rekey = key_changes(old_rows, new_rows)
+            if rekey:
+                change = {**change, "rekey": rekey}
+            with timed("write"):
+                self._write(df, change, delta)
+        except Exception:
+            # An update may already be in the frame, the next read reloads it from the store and the journal
+            self._df = None
+            raise
+        self.kpi = add_kpi(self.kpi, delta)
+        self._df = df
+        self.version += 1
+        self._apply_versions(change)
+
+    def _write(self, df, change, delta):
+        if self.read_only:
+            raise RuntimeError("The dataset was opened read-only")
+        if self.journal is None:
+            self.storage.apply(df, [change], delta)
+            self._signature = self.storage.signature()
+        else:
+            self._seq += 1
+            change = {**change, "seq": self._seq}
+            self.journal.append(change)
+            self._pending.append(change)
+            self._pending_kpi.append(delta)
+
+    def _stored_versions(self):
+        versions = self.storage.load_versions()
+        keys = storage_records(versions[KEY_COLUMNS].assign(ENTRATA=parse_dates(versions["ENTRATA"])))
+        return {(key["TARGA"], key["ENTRATA"]): int(version) for key, version in zip(keys, versions["VERSIONE"])}
+
+    def _next_versions(self, change):
+        # An edited key carries the row's counter along
+        versions = []
+        for update in change["updates"] if change["op"] == "update_many" else [change]:
+            key = tuple(update["key"])
+            values = update["values"]
+            versions.append([values.get("TARGA", key[0]), values.get("ENTRATA", key[1]), self._row_versions.get(key, 0) + 1])
+        return versions
+
+    def _apply_versions(self, change):
+        for old_targa, old_entrata, _, _ in change.get("rekey", []):
+            self._row_versions.pop((old_targa, old_entrata), None)
+        for targa, entrata, version in change.get("versions", []):
+            self._row_versions[(targa, entrata)] = version
+
+    def _update_indexes(self, old_rows, new_rows):
+        for column, index in self._indexes.items():
+            for label, value in new_rows[column].items():
+                if label in old_rows.index:
+                    index.update(label, old_rows.at[label, column], value)
+                else:
+                    index.add(label, value)
+
+    def stato_events(self):
+        # Stored events plus those still waiting in the journal, replayed in order so a key correction
+        # moves the events logged before it. Read between compactions, so no batch is seen twice
+        with self._compacting:
+            with self.lock:
+                pending = list(self._pending)
+            parts = [self.storage.load_events()]
+        for change in pending:
+            if change.get("rekey"):
+                parts = [rekey_events(pd.concat(parts), change["rekey"])]
+            if change.get("events"):
+                parts.append(pd.DataFrame(change["events"], columns=EVENT_COLUMNS))
+        return event_frame(pd.concat(parts))
+
+    def compact(self):
+        # Fold the journal into the main store in batches, the GUI keeps working on memory meanwhile
+        if self.journal is None:
+            return
+        # Two compactions of the same batch would each truncate it from the journal
+        with self._compacting:
+            while True:
+                with self.lock:
+                    df = self.frame()
+                    batch = self._pending[:COMPACT_BATCH_SIZE]
+                    delta = sum_kpi(self._pending_kpi[:len(batch)])
+                if not batch:
+                    return
+                with timed("compact"):
+                    self.storage.apply(df, batch, delta)
+                with self.lock:
+                    self.journal.truncate(len(batch))
+                    del self._pending[:len(batch)]
+                    del self._pending_kpi[:len(batch)]
+                    self._signature = self.storage.signature()
+
+    @timed("recompute")
+    def recompute(self):
+        # Persist fresh derived columns for every row whose stored values went stale.
+        # The lock spans the compaction too, a change committed in between would miss the reloaded frame
+        with self._compacting, self.lock:
+            self.compact()
+            stored = self.storage.load()
+            typed = apply_schema(stored)
+            self._unreadable = unreadable_values(stored, typed)
+            df = keep_stored_derived(recompute_derived(typed, self.calendar), typed, self._unreadable)
+            fresh = storage_frame(df)
+            stale = pd.Series(False, index=df.index)
+            for col in DERIVED_COLUMNS:
+                stale |= _as_text(stored[col]) != _as_text(fresh[col])
+            # Keyed on the stored text, which may predate the dd/mm/yyyy normalization
+            rows = pd.concat([stored[KEY_COLUMNS], fresh[DERIVED_COLUMNS]], axis=1)[stale]
+            changes = [
+                {"op": "update", "key": [row["TARGA"], row["ENTRATA"]], "values": {col: row[col] for col in DERIVED_COLUMNS}}
+                for row in map(to_storage_row, rows.to_dict("records"))
+            ]
+            if changes:
+                self.storage.apply(df, changes, kpi_delta(typed[stale], df[stale]))
+            self._df = df
+            self._keys = key_map(df)
+            # The day counts may have moved since the load, the store now holds exactly this frame
+            self.kpi = kpi_contribution(df)
+            self._signature = self.storage.signature()
+            self._indexes = {}
+            self.version += 1
+            return len(changes)
+
+    def start_compaction(self, interval=COMPACT_INTERVAL):
+        def run():
+            while not self._stop.wait(interval):
+                self.compact()
+
+        self._compactor = threading.Thread(target=run, daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        self.compact()
+        if self.journal is not None:
+            self.journal.close()
+
+    @timed("export_excel")
+    def export_excel(self, file_path):
+        with self._exporting:
+            self._export_excel(file_path)
+
+    def _export_excel(self, file_path):
+        df = self.frame()
+        # An empty store is a failed migration or the wrong database, never a reason to wipe the workbook
+        if df.empty and os.path.exists(file_path) and not read_workbook(file_path).empty:
+            raise ValueError(f"No vehicles to export, {file_path} was left as it is")
+        out = storage_frame(df)
+        with self.lock:
+            unreadable = self._unreadable
+            if not unreadable.empty:
+                # The workbook gets the text as typed rather than a blank
+                out[unreadable.columns] = out[unreadable.columns].astype(object)
+                typed = out.loc[unreadable.index, unreadable.columns]
+                out.loc[unreadable.index, unreadable.columns] = typed.where(unreadable.isna() | typed.notna(), unreadable)
+        write_workbook(file_path, out)
@@ -0,0 +1,42 @@
+# excel_writer.py
+import os
+import shutil
+import tempfile
+from openpyxl import Workbook
+from timing import timed
+
+CHUNK_SIZE = 10_000
+
+
+@timed("excel_write")
+def write_rows(xlsx_path, rows, sheet_name="Sheet1"):
+    # write_only streams every row to disk instead of building the cell model, the rename keeps the old file until the new one is complete
+    # A temp file of its own, two writers of the same workbook never share one
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=os.path.dirname(xlsx_path) or ".")
+    os.close(fd)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    try:
+        for row in rows:
+            sheet.append(row)
+        workbook.save(tmp_path)
+        # mkstemp makes the file private to this user, the workbook keeps the permissions it had
+        if os.path.exists(xlsx_path):
+            shutil.copymode(xlsx_path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, xlsx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def frame_rows(df):
+    yield list(df.columns)
+    for start in range(0, len(df), CHUNK_SIZE):
+        chunk = df.iloc[start:start + CHUNK_SIZE].astype(object)
+        yield from chunk.where(chunk.notna(), None).to_numpy().tolist()
+
+
+def write_frame(xlsx_path, df, sheet_name="Sheet1"):
+    write_rows(xlsx_path, frame_rows(df), sheet_name)
@@ -1,29 +1,21 @@
 # insert_data.py
 import tkinter as tk
-from tkinter import messagebox, ttk
+from tkinter import filedialog, messagebox, ttk
 from tkcalendar import DateEntry
-import pandas as pd
-import numpy as np
-import os
-from datetime import datetime, timedelta
+from tasks import StatusBar, TaskRunner
+from bulk_import import REJECT_COLUMNS, import_vehicles
+from service import insert_vehicle, new_vehicle_row
+from virtual_tree import VirtualTreeview
+from schema import GUI_LABELS, RICAMBI_VALUES, STATO_VALUES
 
 class InsertDataApp:
-    def __init__(self, root, file_path):
+    def __init__(self, root, dataset):
         self.root = root
         self.root.title("Insert Data")
         self.root.geometry("600x400")
-        self.file_path = file_path
+        self.dataset = dataset
 
-        self.gui_labels = [
-            "FLOTTA", "TARGA", "MODELLO", "ENTRATA", "DITTA", "PZ CARR", "STATO", "RICAMBI"
-        ]
-
-        self.excel_labels = [
-            "FLOTTA", "TARGA", "MODELLO", "ENTRATA", "PREV.USCITA", "FER. VET", "DITTA",
-            "GG.INIZ.MECC", "INIZIO.MECC", "GG.LAV.MECC", "FINE MECC",
-            "GG.INIZIO.CARR.", "INIZIO CARR", "GG.LAV.CAR", "FINE CARR",
-            "PZ CARR", "STATO", "DOWN TIME", "DATA ULTIMA ATTIVITA'", "RICAMBI", "FERMO TECNICO"
-        ]
+        self.gui_labels = GUI_LABELS
 
         self.entries = {}
         self.create_widgets()
@@ -40,12 +32,9 @@ class InsertDataApp:
                 entry = DateEntry(form_frame, width=47, background='darkblue', foreground='white', borderwidth=2, date_pattern='dd/mm/yyyy')
                 entry._top_cal.overrideredirect(False)  # Allow window to close
             elif label == "STATO":
-                entry = ttk.Combobox(form_frame, values=[
-                    "ATT.PERZ.", "ATT.AUT.", "ATT.RIC.", "LAV.CAR1", "LAV.CAR2", "LAV.CAR3",
-                    "LAV.CAR4", "LAV.MECC.", "FIN", "ALTRI LAVORI", "DA FATTURARE", "PRONTA", "PRE-CONSEGNA"
-                ], width=47)
+                entry = ttk.Combobox(form_frame, values=STATO_VALUES, width=47)
             elif label == "RICAMBI":
-                entry = ttk.Combobox(form_frame, values=["Sì", "NO"], width=47)
+                entry = ttk.Combobox(form_frame, values=RICAMBI_VALUES, width=47)
             else:
                 entry = tk.Entry(form_frame, width=50)
 
@@ -56,71 +45,56 @@ class InsertDataApp:
         button_frame.pack(fill=tk.X, padx=20, pady=20)
 
         self.save_button = tk.Button(button_frame, text="Save Data", command=self.save_data)
-        self.save_button.pack(pady=20)
+        self.save_button.pack(side=tk.LEFT, expand=True, pady=20)
 
-    def check_duplicate(self, data):
-        if os.path.exists(self.file_path):
-            df = pd.read_excel(self.file_path)
-            if not df.empty:
-                duplicate = df[(df["TARGA"] == data["TARGA"]) & (df["ENTRATA"] == data["ENTRATA"])]
-                if not duplicate.empty:
-                    return True
-        return False
+        self.import_button = tk.Button(button_frame, text="Import File", command=self.import_file)
+        self.import_button.pack(side=tk.LEFT, expand=True, pady=20)
 
-    def calculate_business_days(self, start_date, end_date):
-        return np.busday_count(start_date.date(), end_date.date())
+        self.status_bar = StatusBar(self.root)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tasks = TaskRunner(self.root, self.status_bar)
 
     def save_data(self):
         data = {label: entry.get().upper() if isinstance(entry, tk.Entry) else entry.get() for label, entry in self.entries.items()}
 
-        if self.check_duplicate(data):
-            messagebox.showwarning("Warning", "The combination of TARGA and ENTRATA already exists in the file!")
+        try:
+            row = new_vehicle_row(data)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Date format error: {e}")
             return
 
-        additional_data = {
-            "PREV.USCITA": '',
-            "FER. VET": '',
-            "GG.INIZ.MECC": '',
-            "INIZIO.MECC": '',
-            "GG.LAV.MECC": '',
-            "FINE MECC": '',
-            "GG.INIZIO.CARR.": '',
-            "INIZIO CARR": '',
-            "GG.LAV.CAR": '',
-            "FINE CARR": '',
-            "DOWN TIME FATTURAZIONE": '',
-            "NR. VETTURE": '',
-            "DOWN TIME": '',
-            "DATA ULTIMA ATTIVITA'": '',
-            "FERMO TECNICO": ''
-        }
-
-        if data["ENTRATA"] == '':
-            data["ENTRATA"] = None
-        else:
-            try:
-                entrata_date = datetime.strptime(data["ENTRATA"], "%d/%m/%Y")
-                additional_data["PREV.USCITA"] = (entrata_date + timedelta(days=10)).strftime("%d/%m/%Y")
-            except Exception as e:
-                messagebox.showerror("Error", f"Date format error: {e}")
-                return
-
-        complete_data = {**data, **additional_data}
+        if self.tasks.submit("save", insert_vehicle, self.dataset, row, on_done=self.on_saved, on_error=self.on_save_failed,
+                             message="Salvataggio in corso...", warn_busy=True):
+            self.save_button.config(state=tk.DISABLED)
 
-        for label in self.excel_labels:
-            if label not in complete_data:
-                complete_data[label] = ''
-
-        if os.path.exists(self.file_path):
-            df = pd.read_excel(self.file_path)
+    def on_saved(self, saved):
+        self.save_button.config(state=tk.NORMAL)
+        if saved:
+            messagebox.showinfo("Info", "Data saved successfully!")
         else:
-            df = pd.DataFrame(columns=self.excel_labels)
-
-        new_df = pd.DataFrame([complete_data])
-        df = pd.concat([df, new_df], ignore_index=True)
+            messagebox.showwarning("Warning", "The combination of TARGA and ENTRATA already exists in the file!")
 
-        column_order = ["FLOTTA"] + [col for col in self.excel_labels if col != "FLOTTA"]
-        df = df[column_order]
+    def on_save_failed(self, error):
+        self.save_button.config(state=tk.NORMAL)
+        self.import_button.config(state=tk.NORMAL)
+        messagebox.showerror("Error", f"Error saving data: {error}")
 
-        df.to_excel(self.file_path, index=False)
-        messagebox.showinfo("Info", "Data saved successfully!")
+    def import_file(self):
+        path = filedialog.askopenfilename(parent=self.root, filetypes=[("CSV / Excel", "*.csv *.xlsx"), ("All files", "*.*")])
+        if not path:
+            return
+        if self.tasks.submit("save", import_vehicles, self.dataset, path, on_done=self.on_imported, on_error=self.on_save_failed,
+                             message="Importazione in corso...", warn_busy=True):
+            self.import_button.config(state=tk.DISABLED)
+
+    def on_imported(self, result):
+        self.import_button.config(state=tk.NORMAL)
+        imported, rejected = result
+        messagebox.showinfo("Info", f"Imported {imported} vehicles, rejected {len(rejected)}")
+        if not rejected.empty:
+            report_window = tk.Toplevel(self.root)
+            report_window.title("Rejected rows")
+            report_window.geometry("600x400")
+            report_view = VirtualTreeview(report_window, REJECT_COLUMNS)
+            report_view.pack(fill=tk.BOTH, expand=True)
+            report_view.set_rows(rejected)
@@ -0,0 +1,74 @@
+# kpi.py
+from datetime import date
+from functools import reduce
+import pandas as pd
+from schema import STATO_VALUES
+
+KPI_DIMENSIONS = ["FLOTTA", "DITTA"]
+KPI_INDEX = ["DIMENSIONE", "GRUPPO", "METRICA"]
+# States where the car has left the workshop floor, PREV.USCITA no longer counts against them
+CLOSED_STATI = ["FIN", "DA FATTURARE", "PRONTA", "PRE-CONSEGNA"]
+AVERAGED_COLUMNS = ["DOWN TIME", "FERMO TECNICO"]
+OPEN_PREFIX = "APERTI:"
+STATO_PREFIX = "STATO:"
+KPI_COLUMNS = ["GRUPPO", "VEICOLI"] + STATO_VALUES + ["DOWN TIME MEDIO", "FERMO TECNICO MEDIO", "SCADUTI"]
+
+
+def empty_kpi():
+    return pd.Series([], index=pd.MultiIndex.from_tuples([], names=KPI_INDEX), dtype="int64")
+
+
+def kpi_contribution(df):
+    # Every KPI is a sum over vehicles, so the aggregate of a set of rows can be added or subtracted
+    if df.empty:
+        return empty_kpi()
+    stato = STATO_PREFIX + df["STATO"].astype(object).fillna("").astype(str)
+    is_open = ~df["STATO"].isin(CLOSED_STATI) & df["PREV.USCITA"].notna()
+    scadenza = OPEN_PREFIX + df["PREV.USCITA"].dt.strftime("%Y-%m-%d")
+    parts = []
+    for dimension in KPI_DIMENSIONS:
+        group = df[dimension].astype(object).fillna("").astype(str)
+        metrics = [
+            group.groupby(group).size().rename(lambda name: (name, "VEICOLI")),
+            group.groupby([group, stato]).size(),
+            group[is_open].groupby([group[is_open], scadenza[is_open]]).size(),
+        ]
+        for col in AVERAGED_COLUMNS:
+            values = df[col].astype("float64")
+            metrics.append(values.groupby(group).sum().rename(lambda name, col=col: (name, f"{col}:SOMMA")))
+            metrics.append(values.groupby(group).count().rename(lambda name, col=col: (name, f"{col}:N")))
+        for metric in metrics:
+            metric.index = pd.MultiIndex.from_tuples([(dimension,) + tuple(key) for key in metric.index], names=KPI_INDEX)
+            parts.append(metric.astype("int64"))
+    kpi = pd.concat(parts)
+    return kpi[kpi != 0]
+
+
+def add_kpi(kpi, delta):
+    kpi = kpi.add(delta, fill_value=0).astype("int64")
+    return kpi[kpi != 0]
+
+
+def sum_kpi(deltas):
+    return reduce(add_kpi, deltas, empty_kpi())
+
+
+def kpi_delta(old_rows, new_rows):
+    return add_kpi(kpi_contribution(new_rows), -kpi_contribution(old_rows))
+
+
+def kpi_table(kpi, dimension, today=None):
+    # Wide view for the dashboard, only a few hundred groups whatever the size of the data
+    today = (today or date.today()).isoformat()
+    if kpi.empty or dimension not in kpi.index.get_level_values("DIMENSIONE"):
+        return pd.DataFrame(columns=KPI_COLUMNS)
+    wide = kpi.xs(dimension, level="DIMENSIONE").unstack("METRICA", fill_value=0)
+    table = pd.DataFrame({"GRUPPO": wide.index, "VEICOLI": wide.get("VEICOLI", 0)}, index=wide.index)
+    for stato in STATO_VALUES:
+        table[stato] = wide.get(STATO_PREFIX + stato, 0)
+    for col in AVERAGED_COLUMNS:
+        count = wide.get(f"{col}:N", pd.Series(0, index=wide.index))
+        table[f"{col} MEDIO"] = (wide.get(f"{col}:SOMMA", 0) / count.where(count > 0)).round(1)
+    overdue = [metric for metric in wide.columns if metric.startswith(OPEN_PREFIX) and metric[len(OPEN_PREFIX):] < today]
+    table["SCADUTI"] = wide[overdue].sum(axis=1) if overdue else 0
+    return table.reset_index(drop=True)
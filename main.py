@@ -1,16 +1,44 @@
 # main.py
+import argparse
 import tkinter as tk
+from tkinter import messagebox
+import pandas as pd
 from insert_data import InsertDataApp
 from search_data import SearchDataApp
 from flotta_search import FlottaSearchApp
+from dashboard import FleetDashboardApp
+from dataset import Dataset
+from storage import SQLiteStorage
+from journal import Journal
+from remote import RemoteDataset
+from tasks import StatusBar, TaskRunner
+from virtual_tree import VirtualTreeview
+import timing
+
+EXPORT_INTERVAL_MS = 10 * 60 * 1000
+TIMING_REFRESH_MS = 1000
+TIMING_LOG = "timing.jsonl"
+PROFILE_DIR = "profiles"
+TIMING_COLUMNS = ["OPERAZIONE", "N", "P50 (s)", "P95 (s)"]
 
 class MainApp:
-    def __init__(self, root):
+    def __init__(self, root, server=None):
         self.root = root
         self.root.title("RCTOPCAR B2B DATABASE")
-        self.root.geometry("300x200")
+        self.root.geometry("300x520")
 
         self.file_path = "data.xlsx"
+        self.db_path = "data.db"
+        self.journal_path = "data.journal"
+        timing.configure(TIMING_LOG)
+
+        # With a data server the windows are thin clients and the server owns the files
+        self.remote = server is not None
+        if self.remote:
+            self.dataset = RemoteDataset(server)
+        else:
+            self.dataset = Dataset(SQLiteStorage(self.db_path), Journal(self.journal_path))
+        self.exported_version = self.dataset.version
 
         insert_button = tk.Button(self.root, text="Inserisci Dati", command=self.open_insert_window, width=20, height=2)
         insert_button.pack(pady=10)
@@ -21,19 +49,130 @@ class MainApp:
         flotta_button = tk.Button(self.root, text="Genera Flusso Flotte", command=self.open_flotta_window, width=20, height=2)
         flotta_button.pack(pady=10)
 
+        recompute_button = tk.Button(self.root, text="Ricalcola Giorni", command=self.recompute, width=20, height=1)
+        recompute_button.pack(pady=10)
+
+        export_button = tk.Button(self.root, text="Esporta Excel", command=self.export_excel, width=20, height=1)
+        export_button.pack(pady=10)
+
+        dashboard_button = tk.Button(self.root, text="Cruscotto Flotte", command=self.open_dashboard_window, width=20, height=1)
+        dashboard_button.pack(pady=10)
+
+        self.buttons = [insert_button, search_button, flotta_button, recompute_button, export_button, dashboard_button]
+
+        timing_button = tk.Button(self.root, text="Tempi Operazioni", command=self.show_timings, width=20, height=1)
+        timing_button.pack(pady=10)
+
+        self.profile_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Profilo cProfile", variable=self.profile_var, command=self.toggle_profiling).pack()
+
+        self.status_bar = StatusBar(self.root)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tasks = TaskRunner(self.root, self.status_bar)
+
+        # Breakdown of the last timed operation, whichever window or thread ran it
+        self.timing_label = tk.Label(self.root, anchor="w", justify=tk.LEFT, wraplength=290)
+        self.timing_label.pack(side=tk.BOTTOM, fill=tk.X)
+        self.root.after(TIMING_REFRESH_MS, self.refresh_timing)
+
+        # Nothing may read the dataset before migration and journal replay are done
+        for button in self.buttons:
+            button.config(state=tk.DISABLED)
+        self.tasks.submit("load", self.load, on_done=self.on_loaded, message="Caricamento dati...")
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(EXPORT_INTERVAL_MS, self.periodic_export)
+
+    def load(self):
+        if self.remote:
+            # Migration and journal replay are the server's job, only make sure it answers
+            self.dataset.ping()
+            return
+
+        # One-time migration of the legacy workbook into the SQLite store
+        if self.dataset.storage.needs_migration():
+            with timing.timed("migrate"):
+                self.dataset.storage.migrate_from_excel(self.file_path)
+
+        # Replay whatever a previous session left in the journal, then keep folding it in the background
+        self.dataset.compact()
+        self.dataset.start_compaction()
+        self.dataset.build_indexes()
+
+    def on_loaded(self, _):
+        for button in self.buttons:
+            button.config(state=tk.NORMAL)
+
     def open_insert_window(self):
         self.insert_window = tk.Toplevel(self.root)
-        InsertDataApp(self.insert_window, self.file_path)
+        InsertDataApp(self.insert_window, self.dataset)
 
     def open_search_window(self):
         self.search_window = tk.Toplevel(self.root)
-        SearchDataApp(self.search_window, self.file_path)
+        SearchDataApp(self.search_window, self.dataset)
 
     def open_flotta_window(self):
         self.flotta_window = tk.Toplevel(self.root)
-        FlottaSearchApp(self.flotta_window, self.file_path)
+        FlottaSearchApp(self.flotta_window, self.dataset)
+
+    def open_dashboard_window(self):
+        self.dashboard_window = tk.Toplevel(self.root)
+        FleetDashboardApp(self.dashboard_window, self.dataset)
+
+    def recompute(self):
+        self.tasks.submit("recompute", self.dataset.recompute,
+                          on_done=lambda updated: messagebox.showinfo("Info", f"Giorni ricalcolati su {updated} righe"),
+                          message="Ricalcolo giorni...")
+
+    def export_excel(self):
+        version = self.dataset.version
+        self.tasks.submit("export", self.dataset.export_excel, self.file_path,
+                          on_done=lambda _: self.on_exported(version), message="Esportazione Excel...")
+
+    def on_exported(self, version):
+        self.exported_version = version
+
+    def periodic_export(self):
+        if self.dataset.version != self.exported_version:
+            self.export_excel()
+        self.root.after(EXPORT_INTERVAL_MS, self.periodic_export)
+
+    def refresh_timing(self):
+        record = timing.last_operation()
+        if record is not None:
+            self.timing_label.config(text=timing.describe(record))
+        self.root.after(TIMING_REFRESH_MS, self.refresh_timing)
+
+    def toggle_profiling(self):
+        timing.set_profiling(PROFILE_DIR if self.profile_var.get() else None)
+
+    def show_timings(self):
+        stats = timing.summary()
+        timing_window = tk.Toplevel(self.root)
+        timing_window.title("Tempi Operazioni")
+        timing_window.geometry("500x400")
+        timing_view = VirtualTreeview(timing_window, TIMING_COLUMNS)
+        timing_view.pack(fill=tk.BOTH, expand=True)
+        timing_view.set_rows(pd.DataFrame(
+            [[name, stat["count"], stat["p50_s"], stat["p95_s"]] for name, stat in stats.items()],
+            columns=TIMING_COLUMNS,
+        ))
+
+    def on_close(self):
+        # Closing is the one place where blocking is fine, the export must finish before exit.
+        # An export task still running finishes first, Dataset.export_excel writes one at a time
+        if self.dataset.version != self.exported_version:
+            try:
+                self.dataset.export_excel(self.file_path)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+        self.dataset.close()
+        self.root.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", help="host:port of a running server.py, the files are used directly otherwise")
+    args = parser.parse_args()
     root = tk.Tk()
-    app = MainApp(root)
+    app = MainApp(root, args.server)
     root.mainloop()
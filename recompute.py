@@ -0,0 +1,87 @@
+# recompute.py
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from schema import parse_dates
+
+DERIVED_COLUMNS = [
+    "FER. VET", "GG.INIZ.MECC", "GG.LAV.MECC", "GG.INIZIO.CARR.", "GG.LAV.CAR",
+    "DOWN TIME", "FERMO TECNICO", "DATA ULTIMA ATTIVITA'"
+]
+
+# Fixed-date Italian public holidays as (month, day)
+ITALIAN_FIXED_HOLIDAYS = [
+    (1, 1), (1, 6), (4, 25), (5, 1), (6, 2), (8, 15), (11, 1), (12, 8), (12, 25), (12, 26)
+]
+
+
+def easter_sunday(year):
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def italian_holidays(years):
+    holidays = []
+    for year in years:
+        holidays.extend(date(year, month, day) for month, day in ITALIAN_FIXED_HOLIDAYS)
+        holidays.append(easter_sunday(year) + timedelta(days=1))  # Pasquetta
+    return np.array(holidays, dtype="datetime64[D]")
+
+
+def italian_calendar(first_year=2000, last_year=2050, extra_holidays=()):
+    holidays = np.concatenate([
+        italian_holidays(range(first_year, last_year + 1)),
+        np.array(list(extra_holidays), dtype="datetime64[D]"),
+    ])
+    return np.busdaycalendar(holidays=holidays)
+
+
+def day_array(series, errors="coerce"):
+    return parse_dates(series, errors).to_numpy().astype("datetime64[D]")
+
+
+def business_days(start, end, calendar):
+    valid = ~(np.isnat(start) | np.isnat(end))
+    # Any two dates pandas can hold are less than 2**31 days apart
+    counts = np.zeros(len(start), dtype="int32")
+    counts[valid] = np.busday_count(start[valid], end[valid], busdaycal=calendar)
+    return pd.arrays.IntegerArray(counts, ~valid)
+
+
+def recompute_derived(df, calendar=None, errors="coerce"):
+    if calendar is None:
+        calendar = italian_calendar()
+    df = df.copy()
+    if df.empty:
+        return df
+
+    entrata = day_array(df["ENTRATA"], errors)
+    inizio_mecc = day_array(df["INIZIO.MECC"], errors)
+    fine_mecc = day_array(df["FINE MECC"], errors)
+    inizio_carr = day_array(df["INIZIO CARR"], errors)
+    fine_carr = day_array(df["FINE CARR"], errors)
+
+    # fmin/fmax skip NaT, so a single missing phase does not blank the whole span
+    ultima_attivita = np.fmax(fine_mecc, fine_carr)
+    start = np.fmin(inizio_mecc, inizio_carr)
+
+    df["DATA ULTIMA ATTIVITA'"] = pd.Series(ultima_attivita, index=df.index).astype("datetime64[ns]")
+    df["FER. VET"] = business_days(entrata, ultima_attivita, calendar)
+    df["GG.INIZ.MECC"] = business_days(entrata, inizio_mecc, calendar)
+    df["GG.INIZIO.CARR."] = business_days(entrata, inizio_carr, calendar)
+    df["GG.LAV.MECC"] = business_days(inizio_mecc, fine_mecc, calendar)
+    df["GG.LAV.CAR"] = business_days(inizio_carr, fine_carr, calendar)
+    df["DOWN TIME"] = business_days(entrata, ultima_attivita, calendar)
+    df["FERMO TECNICO"] = business_days(start, ultima_attivita, calendar)
+    return df
+
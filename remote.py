@@ -0,0 +1,146 @@
+# remote.py
+import base64
+import http.client
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+import pandas as pd
+from dataset import VersionConflict
+from kpi import KPI_INDEX
+from recompute import italian_calendar
+from schema import COLUMNS, apply_schema, storage_records, to_storage_row
+
+DEFAULT_PORT = 8765
+REQUEST_TIMEOUT = 120
+
+
+def frame_payload(df):
+    # Rows travel as storage values, the same text the journal and the database hold
+    return {"labels": df.index.tolist(), "rows": storage_records(df[COLUMNS]), "versions": df["VERSIONE"].tolist()}
+
+
+def payload_frame(payload):
+    df = apply_schema(pd.DataFrame(payload["rows"], index=payload["labels"], columns=COLUMNS))
+    return df.assign(VERSIONE=pd.Series(payload["versions"], index=df.index, dtype="int64"))
+
+
+def table_payload(df):
+    df = df.astype(object)
+    return {"columns": [str(col) for col in df.columns], "rows": df.where(df.notna(), None).values.tolist()}
+
+
+def payload_table(payload):
+    return pd.DataFrame(payload["rows"], columns=payload["columns"])
+
+
+def kpi_payload(kpi):
+    return [list(key) + [int(value)] for key, value in kpi.items()]
+
+
+def payload_kpi(payload):
+    return pd.DataFrame(payload, columns=KPI_INDEX + ["VALORE"]).set_index(KPI_INDEX)["VALORE"].astype("int64")
+
+
+class RemoteDataset:
+    # Thin client of server.py, the windows call the service functions on it as on a local Dataset
+    def __init__(self, address, calendar=None):
+        parts = urlsplit(address if "//" in address else "http://" + address)
+        self.host = parts.hostname
+        self.port = parts.port or DEFAULT_PORT
+        # Derived columns of an edit are still computed here, the server only stores them
+        self.calendar = calendar if calendar is not None else italian_calendar()
+        self.version = 0
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self):
+        # One keep-alive connection per worker thread, reused for every request it makes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _drop_connection(self):
+        conn = self._local.conn
+        conn.close()
+        self._local.conn = None
+        with self._connections_lock:
+            self._connections.remove(conn)
+
+    def call(self, path, request=None):
+        body = json.dumps(request or {}).encode("utf-8")
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", path, body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The server restarted since this connection was opened, try once on a fresh one
+                self._drop_connection()
+                if attempt:
+                    raise
+        if response.status == 409:
+            raise VersionConflict(payload["error"])
+        if response.status == 400:
+            raise ValueError(payload["error"])
+        if response.status != 200:
+            raise RuntimeError(payload["error"])
+        return payload
+
+    def ping(self):
+        return self.call("/ping")
+
+    def search_vehicles(self, column, term):
+        results = self.call("/search", {"column": column, "term": term})["results"]
+        return None if results is None else payload_frame(results)
+
+    def insert_vehicle(self, row):
+        return self.call("/insert", {"row": to_storage_row(row)})["inserted"]
+
+    def update_vehicle(self, targa, entrata, values, version=None):
+        request = {"targa": targa, "entrata": entrata, "values": to_storage_row(values), "version": version}
+        return self.call("/update", request)["updated"]
+
+    def update_vehicles(self, edits, versions=None):
+        versions = versions or {}
+        request = {"edits": [[targa, entrata, values, versions.get((targa, entrata))] for (targa, entrata), values in edits.items()]}
+        return self.call("/update_many", request)["updated"]
+
+    def fleet_report(self, flotta):
+        report = self.call("/fleet_report", {"flotta": flotta})
+        if report["results"] is None:
+            return None
+        return payload_frame(report["results"]), report["table_data"]
+
+    def import_vehicles(self, path):
+        with open(path, "rb") as f:
+            content = base64.b64encode(f.read()).decode("ascii")
+        result = self.call("/import", {"filename": os.path.basename(path), "content": content})
+        return result["imported"], payload_table(result["rejected"])
+
+    def stato_history(self, analysis, by="FLOTTA"):
+        return payload_table(self.call("/stato_history", {"analysis": analysis, "by": by})["table"])
+
+    @property
+    def kpi(self):
+        return payload_kpi(self.call("/kpi")["kpi"])
+
+    def recompute(self):
+        return self.call("/recompute")["updated"]
+
+    def export_excel(self, file_path=None):
+        # The server writes its own workbook, next to its database
+        self.call("/export")
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
@@ -0,0 +1,74 @@
+# reports.py
+from datetime import datetime
+import pandas as pd
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph
+from schema import STATO_VALUES
+from excel_writer import write_rows
+from timing import timed
+
+
+@timed("build_table_data")
+def build_table_data(results):
+    # One pivot: cumcount numbers the TARGA within each STATO, which becomes the table row
+    known = results[results["STATO"].isin(STATO_VALUES)]
+    slots = known.groupby("STATO", sort=False, observed=True).cumcount()
+    table = (
+        pd.DataFrame({"STATO": known["STATO"].astype(object).to_numpy(), "ROW": slots.to_numpy(), "TARGA": known["TARGA"].to_numpy()})
+        .pivot(index="ROW", columns="STATO", values="TARGA")
+        .reindex(columns=STATO_VALUES)
+    )
+    counts = table.notna().sum()
+    table = table.astype(object).where(table.notna(), "")
+
+    table_data = [["Row"] + STATO_VALUES]
+    for i, row in enumerate(table.itertuples(index=False)):
+        table_data.append([f"Row {i + 1}"] + list(row))
+
+    # Add the counts at the bottom
+    table_data.append(["Count"] + [int(count) for count in counts])
+
+    total_targa = len(results["TARGA"].unique())
+    table_data.append(["Total"] + [""] * (len(STATO_VALUES) - 1) + [total_targa])
+    return table_data
+
+
+def report_title(flotta):
+    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"Search Results for FLOTTA: {flotta} (Generated on {current_date})"
+
+
+def write_pdf(pdf_path, flotta, table_data, total_targa):
+    doc = SimpleDocTemplate(pdf_path, pagesize=A4)
+    elements = []
+
+    styles = getSampleStyleSheet()
+    title_style = styles['Title']
+    normal_style = styles['Normal']
+
+    elements.append(Paragraph(report_title(flotta), title_style))
+    elements.append(Paragraph(f"Total TARGA: {total_targa}", normal_style))
+
+    # LongTable splits across pages cheaply and repeats the STATO header on each one
+    table = LongTable(table_data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    elements.append(table)
+
+    with timed("pdf_build"):
+        doc.build(elements)
+
+
+def write_excel(excel_path, flotta, table_data, sheet_name=None):
+    # Header, then the title row, then the table, as the sheet has always been laid out
+    rows = [table_data[0], [report_title(flotta)]] + table_data[1:]
+    write_rows(excel_path, rows, sheet_name or flotta)
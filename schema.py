@@ -0,0 +1,152 @@
+# schema.py
+from datetime import date
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = "%d/%m/%Y"
+
+COLUMNS = [
+    "FLOTTA", "TARGA", "MODELLO", "ENTRATA", "PREV.USCITA", "FER. VET", "DITTA",
+    "GG.INIZ.MECC", "INIZIO.MECC", "GG.LAV.MECC", "FINE MECC",
+    "GG.INIZIO.CARR.", "INIZIO CARR", "GG.LAV.CAR", "FINE CARR",
+    "PZ CARR", "STATO", "DOWN TIME", "DATA ULTIMA ATTIVITA'", "RICAMBI", "FERMO TECNICO"
+]
+
+KEY_COLUMNS = ["TARGA", "ENTRATA"]
+
+# Fields typed in the insert form and editable in the search window
+GUI_LABELS = ["FLOTTA", "TARGA", "MODELLO", "ENTRATA", "DITTA", "PZ CARR", "STATO", "RICAMBI"]
+EDITABLE_LABELS = [
+    "FLOTTA", "TARGA", "MODELLO", "ENTRATA", "DITTA", "INIZIO.MECC", "FINE MECC",
+    "INIZIO CARR", "FINE CARR", "PZ CARR", "STATO", "RICAMBI"
+]
+
+STATO_VALUES = [
+    "ATT.PERZ.", "ATT.AUT.", "ATT.RIC.", "LAV.CAR1", "LAV.CAR2", "LAV.CAR3",
+    "LAV.CAR4", "LAV.MECC.", "FIN", "ALTRI LAVORI", "DA FATTURARE", "PRONTA", "PRE-CONSEGNA"
+]
+RICAMBI_VALUES = ["SÌ", "NO"]
+
+CATEGORY_COLUMNS = ["FLOTTA", "MODELLO", "DITTA", "STATO", "RICAMBI"]
+DATE_COLUMNS = ["ENTRATA", "PREV.USCITA", "INIZIO.MECC", "FINE MECC", "INIZIO CARR", "FINE CARR", "DATA ULTIMA ATTIVITA'"]
+DAY_COUNT_COLUMNS = ["FER. VET", "GG.INIZ.MECC", "GG.LAV.MECC", "GG.INIZIO.CARR.", "GG.LAV.CAR", "DOWN TIME", "FERMO TECNICO", "PZ CARR"]
+
+
+def stato_dtype(values=()):
+    # The 13 known states keep their workflow order, anything typed by hand is appended after them
+    extras = sorted(set(values) - set(STATO_VALUES))
+    return pd.CategoricalDtype(STATO_VALUES + extras, ordered=True)
+
+
+def parse_dates(series, errors="coerce"):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.normalize().astype("datetime64[ns]")
+    # A workshop has a few hundred distinct dates, each one is parsed once
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    text = text.where(text != "")
+    parsed = pd.to_datetime(text, format=DATE_FORMAT, errors="coerce")
+    # Years typed with two digits, then real Excel dates and older exports that come back as ISO text
+    for fallback in ["%d/%m/%y", "ISO8601"]:
+        invalid = text.notna() & parsed.isna()
+        if invalid.any():
+            parsed[invalid] = pd.to_datetime(text[invalid], format=fallback, errors="coerce")
+    invalid = text.notna() & parsed.isna()
+    if errors == "raise" and invalid.any():
+        raise ValueError(f"Invalid date: {text[invalid].iloc[0]!r}, expected dd/mm/yyyy")
+    # Code -1 marks a missing value and picks the trailing NaT
+    values = np.append(parsed.dt.normalize().to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))
+    return pd.Series(values[codes], index=series.index)
+
+
+def parse_counts(series):
+    # Blank cells, stray text and numbers too large to be a day count become NA, reported like an unreadable date
+    counts = pd.to_numeric(series, errors="coerce").round()
+    return counts.where(counts.abs() <= np.iinfo("int32").max).astype("Int32")
+
+
+def unreadable_cells(raw, df):
+    # Source values the schema could not type: text in the store, a blank in the typed frame
+    columns = DATE_COLUMNS + DAY_COUNT_COLUMNS
+    raw = raw.reindex(columns=columns)
+    filled = raw.notna() & (raw.apply(lambda col: col.astype(str).str.strip()) != "")
+    return filled & df[columns].isna()
+
+
+def apply_schema(df, errors="coerce"):
+    df = df.reindex(columns=COLUMNS)
+    for col in DATE_COLUMNS:
+        df[col] = parse_dates(df[col], errors)
+    for col in DAY_COUNT_COLUMNS:
+        df[col] = parse_counts(df[col])
+    for col in CATEGORY_COLUMNS:
+        text = df[col].astype(object)
+        text = text.where(text.notna() & (text != ""))
+        dtype = stato_dtype(text.dropna().unique()) if col == "STATO" else "category"
+        df[col] = text.astype(dtype)
+    return df
+
+
+def concat_frames(df, new_df):
+    # Concatenating categoricals with different categories would silently fall back to object.
+    # Both frames gain the missing categories in place, pd.concat is then the only copy
+    for col in CATEGORY_COLUMNS:
+        missing = new_df[col].cat.categories.difference(df[col].cat.categories)
+        if len(missing):
+            df[col] = df[col].cat.add_categories(list(missing))
+        new_df[col] = new_df[col].astype(df[col].dtype)
+    return pd.concat([df, new_df])
+
+
+def set_values(df, labels, rows):
+    # Rows are typed together, then every column is assigned in one go
+    typed = apply_schema(pd.DataFrame(rows))
+    for col in dict.fromkeys(col for row in rows for col in row):
+        given = np.array([col in row for row in rows])
+        values = typed[col][given]
+        if col in CATEGORY_COLUMNS:
+            missing = pd.Index(values.dropna().unique()).difference(df[col].cat.categories)
+            if len(missing):
+                df[col] = df[col].cat.add_categories(list(missing))
+            values = values.astype(object)
+        df.loc[labels[given], col] = values.to_numpy()
+
+
+def to_storage_value(value):
+    if value is pd.NaT:
+        return None
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else pd.Timestamp(value).strftime(DATE_FORMAT)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+
+def to_storage_row(row):
+    return {col: to_storage_value(value) for col, value in row.items()}
+
+
+def storage_frame(df):
+    # Dates as dd/mm/yyyy text and plain objects, the format of the workbook, the database and the journal
+    df = df.copy()
+    for col in DATE_COLUMNS:
+        if col in df.columns and pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime(DATE_FORMAT).astype(object)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def storage_records(df):
+    df = storage_frame(df).astype(object)
+    return [to_storage_row(row) for row in df.where(df.notna(), None).to_dict("records")]
+
+
+def display_frame(df):
+    df = storage_frame(df).astype(object)
+    return df.where(df.notna(), "")
@@ -2,28 +2,25 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
 import pandas as pd
-from datetime import datetime
-import numpy as np
-import os
+from dataset import Dataset
+from virtual_tree import VirtualTreeview
+from storage import SQLiteStorage
+from schema import COLUMNS, EDITABLE_LABELS, KEY_COLUMNS, RICAMBI_VALUES, STATO_VALUES, storage_frame
+from service import edited_values, search_vehicles, update_vehicle, update_vehicles
+from tasks import StatusBar, TaskRunner, bind_live_search
+
+PENDING_COLUMNS = ["TARGA", "ENTRATA", "MODIFICHE"]
 
 class SearchDataApp:
-    def __init__(self, root, file_path):
+    def __init__(self, root, dataset):
         self.root = root
         self.root.title("Search Data")
         self.root.geometry("800x600")
-        self.file_path = file_path
+        self.dataset = dataset
 
-        self.labels = [
-            "FLOTTA", "TARGA", "MODELLO", "ENTRATA", "PREV.USCITA", "FER. VET", "DITTA",
-            "GG.INIZ.MECC", "INIZIO.MECC", "GG.LAV.MECC", "FINE MECC",
-            "GG.INIZIO.CARR.", "INIZIO CARR", "GG.LAV.CAR", "FINE CARR",
-            "PZ CARR", "STATO", "DOWN TIME", "DATA ULTIMA ATTIVITA'", "RICAMBI", "FERMO TECNICO"
-        ]
+        self.labels = COLUMNS
 
-        self.editable_labels = [
-            "FLOTTA", "TARGA", "MODELLO", "ENTRATA", "DITTA", "INIZIO.MECC", "FINE MECC",
-            "INIZIO CARR", "FINE CARR", "PZ CARR", "STATO", "RICAMBI"
-        ]
+        self.editable_labels = EDITABLE_LABELS
 
         search_frame = tk.Frame(self.root)
         search_frame.pack(pady=20)
@@ -31,30 +28,51 @@ class SearchDataApp:
         tk.Label(search_frame, text="Enter TARGA:").grid(row=0, column=0, padx=10, pady=10)
         self.targa_entry = tk.Entry(search_frame)
         self.targa_entry.grid(row=0, column=1, padx=10, pady=10)
+        bind_live_search(self.targa_entry, self.display_search_results)
         search_button = tk.Button(search_frame, text="Search", command=self.display_search_results)
         search_button.grid(row=0, column=2, padx=10, pady=10)
 
-        self.tree = ttk.Treeview(self.root, columns=self.labels, show='headings')
-        for col in self.labels:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100)
-        
-        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.results_view = VirtualTreeview(self.root, self.labels)
+        self.results_view.pack(fill=tk.BOTH, expand=True)
+        self.tree = self.results_view.tree
+        self.tree.configure(selectmode="extended")
         self.tree.bind("<Double-1>", self.on_double_click)
 
-    def display_search_results(self):
+        # Edits staged on the selection wait here until one commit writes them all
+        self.pending = {}
+        # VERSIONE of every row as last read, sent back with its edit so a newer save by someone else is not overwritten
+        self.versions = {}
+        self.pending_versions = {}
+        pending_frame = tk.Frame(self.root)
+        pending_frame.pack(fill=tk.X, padx=10)
+        self.bulk_button = tk.Button(pending_frame, text="Edit Selected", command=self.bulk_edit)
+        self.bulk_button.pack(side=tk.LEFT, padx=5, pady=5)
+        self.commit_button = tk.Button(pending_frame, text="Commit", command=self.commit_pending, state=tk.DISABLED)
+        self.commit_button.pack(side=tk.LEFT, padx=5, pady=5)
+        self.discard_button = tk.Button(pending_frame, text="Discard", command=self.discard_pending, state=tk.DISABLED)
+        self.discard_button.pack(side=tk.LEFT, padx=5, pady=5)
+        self.pending_view = VirtualTreeview(self.root, PENDING_COLUMNS)
+        self.pending_view.tree.configure(height=5)
+        self.pending_view.pack(fill=tk.X, padx=10)
+
+        self.status_bar = StatusBar(self.root)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tasks = TaskRunner(self.root, self.status_bar)
+
+    def display_search_results(self, live=False):
         targa = self.targa_entry.get()
-        if os.path.exists(self.file_path):
-            df = pd.read_excel(self.file_path)
-            results = df[df["TARGA"].str.contains(targa, case=False, na=False)]
-            if not results.empty:
-                self.tree.delete(*self.tree.get_children())
-                for _, row in results.iterrows():
-                    self.tree.insert("", tk.END, values=list(row))
-            else:
-                messagebox.showinfo("Info", "No results found!")
-        else:
+        self.tasks.submit("search", search_vehicles, self.dataset, "TARGA", targa, on_done=lambda found: self.show_results(found, live),
+                          message="Ricerca in corso...", supersede=True)
+
+    def show_results(self, results, live=False):
+        if results is None:
             messagebox.showinfo("Info", "No data file found!")
+        elif not results.empty or live:
+            keys = storage_frame(results[KEY_COLUMNS]).itertuples(index=False, name=None)
+            self.versions = dict(zip(keys, results["VERSIONE"].tolist()))
+            self.results_view.set_rows(results)
+        else:
+            messagebox.showinfo("Info", "No results found!")
 
     def on_double_click(self, event):
         item = self.tree.selection()[0]
@@ -68,13 +86,10 @@ class SearchDataApp:
                 lbl = tk.Label(self.edit_window, text=col)
                 lbl.grid(row=i, column=0, padx=5, pady=5)
                 if col == "STATO":
-                    entry = ttk.Combobox(self.edit_window, values=[
-                        "ATT.PERZ.", "ATT.AUT.", "ATT.RIC.", "LAV.CAR1", "LAV.CAR2", "LAV.CAR3",
-                        "LAV.CAR4", "LAV.MECC.", "FIN", "ALTRI LAVORI", "DA FATTURARE", "PRONTA", "PRE-CONSEGNA"
-                    ], width=47)
+                    entry = ttk.Combobox(self.edit_window, values=STATO_VALUES, width=47)
                     entry.set(row_data[i])
                 elif col == "RICAMBI":
-                    entry = ttk.Combobox(self.edit_window, values=["SÌ", "NO"], width=47)
+                    entry = ttk.Combobox(self.edit_window, values=RICAMBI_VALUES, width=47)
                     entry.set(row_data[i])
                 else:
                     entry = tk.Entry(self.edit_window, width=50)
@@ -85,95 +100,110 @@ class SearchDataApp:
         self.update_button = tk.Button(self.edit_window, text="Update", command=lambda: self.update_row(item, row_data))
         self.update_button.grid(row=len(self.labels), columnspan=2, pady=10)
 
-    def calculate_business_days(self, start_date, end_date):
-        return np.busday_count(start_date.date(), end_date.date())
-
     def update_row(self, item, original_values):
+        values = {col: self.entries[col].get() for col in self.editable_labels}
+        try:
+            values = edited_values(values, self.dataset.calendar)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error in calculations: {e}")
+            return
+
+        version = self.versions.get((original_values[1], original_values[3]))
+        if not self.tasks.submit("save", update_vehicle, self.dataset, original_values[1], original_values[3], values, version,
+                                 on_done=self.on_saved, on_error=self.on_save_failed, message="Salvataggio in corso...", warn_busy=True):
+            return
+        self.update_button.config(state=tk.DISABLED)
+
         updated_values = list(original_values)  # Copy original values to update only editable fields
         for col in self.editable_labels:
             index = self.labels.index(col)
             updated_values[index] = self.entries[col].get()
         
         self.tree.item(item, values=updated_values)
-        
-        if os.path.exists(self.file_path):
-            df = pd.read_excel(self.file_path)
-            index = df[(df["TARGA"] == original_values[1]) & (df["ENTRATA"] == original_values[3])].index
-            if not index.empty:
-                for col in self.editable_labels:
-                    df.at[index[0], col] = self.entries[col].get()
-
-                # Calculate additional fields
-                entrata = self.entries["ENTRATA"].get()
-                inizio_mecc = self.entries["INIZIO.MECC"].get()
-                fine_mecc = self.entries["FINE MECC"].get()
-                inizio_carr = self.entries["INIZIO CARR"].get()
-                fine_carr = self.entries["FINE CARR"].get()
-                pz_carr = self.entries["PZ CARR"].get()
-
-                try:
-                    entrata_date = datetime.strptime(entrata, "%d/%m/%Y") if entrata else None
-                    inizio_mecc_date = datetime.strptime(inizio_mecc, "%d/%m/%Y") if inizio_mecc else None
-                    fine_mecc_date = datetime.strptime(fine_mecc, "%d/%m/%Y") if fine_mecc else None
-                    inizio_carr_date = datetime.strptime(inizio_carr, "%d/%m/%Y") if inizio_carr else None
-                    fine_carr_date = datetime.strptime(fine_carr, "%d/%m/%Y") if fine_carr else None
-
-                    # DATA ULTIMA ATTIVITA'
-                    data_ultima_attivita_date = max(fine_mecc_date, fine_carr_date) if fine_mecc_date and fine_carr_date else fine_mecc_date or fine_carr_date
-                    df.at[index[0], "DATA ULTIMA ATTIVITA'"] = data_ultima_attivita_date.strftime("%d/%m/%Y") if data_ultima_attivita_date else None
-
-                    # FER. VET
-                    if entrata_date and data_ultima_attivita_date:
-                        df.at[index[0], "FER. VET"] = self.calculate_business_days(entrata_date, data_ultima_attivita_date)
-
-                    # GG.INIZ.MECC
-                    if entrata_date and inizio_mecc_date:
-                        df.at[index[0], "GG.INIZ.MECC"] = self.calculate_business_days(entrata_date, inizio_mecc_date)
-
-                    # GG.INIZIO.CARR
-                    if entrata_date and inizio_carr_date:
-                        df.at[index[0], "GG.INIZIO.CARR."] = self.calculate_business_days(entrata_date, inizio_carr_date)
-
-                    # GG.LAV.MECC
-                    if inizio_mecc_date and fine_mecc_date:
-                        df.at[index[0], "GG.LAV.MECC"] = self.calculate_business_days(inizio_mecc_date, fine_mecc_date)
-
-                    # GG.LAV.CARR
-                    if inizio_carr_date and fine_carr_date:
-                        df.at[index[0], "GG.LAV.CAR"] = self.calculate_business_days(inizio_carr_date, fine_carr_date)
-
-                    # DOWN TIME
-                    if entrata_date and data_ultima_attivita_date:
-                        df.at[index[0], "DOWN TIME"] = self.calculate_business_days(entrata_date, data_ultima_attivita_date)
-
-                    # FERMO TECNICO
-                    start_date = min(date for date in [inizio_mecc_date, inizio_carr_date] if date)
-                    end_date = max(date for date in [fine_mecc_date, fine_carr_date] if date)
-                    if start_date and end_date:
-                        df.at[index[0], "FERMO TECNICO"] = self.calculate_business_days(start_date, end_date)
-
-                    # Handle PZ CARR being blank or 0
-                    if not pz_carr:
-                        df.at[index[0], "INIZIO CARR"] = None
-                        df.at[index[0], "FINE CARR"] = None
-                        df.at[index[0], "GG.LAV.CAR"] = None
-
-                except Exception as e:
-                    messagebox.showerror("Error", f"Error in calculations: {e}")
-
-                # Ensure PZ CARR is stored as a number
-                try:
-                    df.at[index[0], "PZ CARR"] = int(pz_carr)
-                except ValueError:
-                    df.at[index[0], "PZ CARR"] = None
-
-                df.to_excel(self.file_path, index=False)
-                messagebox.showinfo("Info", "Data updated successfully!")
-        
+
+    def bulk_edit(self):
+        items = self.tree.selection()
+        if not items:
+            messagebox.showinfo("Info", "Select the rows to edit first")
+            return
+        self.bulk_window = tk.Toplevel(self.root)
+        self.bulk_window.title(f"Edit {len(items)} rows")
+        tk.Label(self.bulk_window, text="Only the filled fields are changed").grid(row=0, columnspan=2, pady=5)
+        self.bulk_entries = {}
+        for i, col in enumerate(col for col in self.editable_labels if col not in ("TARGA", "ENTRATA")):
+            tk.Label(self.bulk_window, text=col).grid(row=i + 1, column=0, padx=5, pady=5)
+            if col == "STATO":
+                entry = ttk.Combobox(self.bulk_window, values=STATO_VALUES, width=47)
+            elif col == "RICAMBI":
+                entry = ttk.Combobox(self.bulk_window, values=RICAMBI_VALUES, width=47)
+            else:
+                entry = tk.Entry(self.bulk_window, width=50)
+            entry.grid(row=i + 1, column=1, padx=5, pady=5)
+            self.bulk_entries[col] = entry
+        tk.Button(self.bulk_window, text="Stage", command=lambda: self.stage_edits(items)).grid(
+            row=len(self.bulk_entries) + 1, columnspan=2, pady=10)
+
+    def stage_edits(self, items):
+        values = {col: entry.get().strip() for col, entry in self.bulk_entries.items() if entry.get().strip()}
+        self.bulk_window.destroy()
+        if not values:
+            return
+        targa_index, entrata_index = self.labels.index("TARGA"), self.labels.index("ENTRATA")
+        for item in items:
+            row_data = list(self.tree.item(item, "values"))
+            key = (row_data[targa_index], row_data[entrata_index])
+            self.pending.setdefault(key, {}).update(values)
+            self.pending_versions.setdefault(key, self.versions.get(key))
+            for col, value in values.items():
+                row_data[self.labels.index(col)] = value
+            self.tree.item(item, values=row_data)
+        self.show_pending()
+
+    def show_pending(self):
+        self.pending_view.set_rows(pd.DataFrame(
+            [[targa, entrata, ", ".join(f"{col}={value}" for col, value in values.items())]
+             for (targa, entrata), values in self.pending.items()],
+            columns=PENDING_COLUMNS,
+        ))
+        state = tk.NORMAL if self.pending else tk.DISABLED
+        self.commit_button.config(state=state, text=f"Commit ({len(self.pending)})" if self.pending else "Commit")
+        self.discard_button.config(state=state)
+
+    def commit_pending(self):
+        if self.tasks.submit("save", update_vehicles, self.dataset, dict(self.pending), dict(self.pending_versions), on_done=self.on_committed,
+                             on_error=self.on_commit_failed, message="Salvataggio in corso...", warn_busy=True):
+            self.commit_button.config(state=tk.DISABLED)
+
+    def on_committed(self, updated):
+        self.pending = {}
+        self.pending_versions = {}
+        self.show_pending()
+        messagebox.showinfo("Info", f"{updated} rows updated")
+        self.display_search_results(True)
+
+    def on_commit_failed(self, error):
+        self.commit_button.config(state=tk.NORMAL)
+        messagebox.showerror("Error", f"Error updating data: {error}")
+
+    def discard_pending(self):
+        self.pending = {}
+        self.pending_versions = {}
+        self.show_pending()
+        self.display_search_results(True)
+
+    def on_saved(self, saved):
+        if saved:
+            messagebox.showinfo("Info", "Data updated successfully!")
         self.edit_window.destroy()
+        # Reread the row so its next edit carries the new VERSIONE
+        self.display_search_results(True)
+
+    def on_save_failed(self, error):
+        self.update_button.config(state=tk.NORMAL)
+        messagebox.showerror("Error", f"Error updating data: {error}")
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = SearchDataApp(root, "data.xlsx")
+    app = SearchDataApp(root, Dataset(SQLiteStorage("data.db")))
     root.mainloop()
 
@@ -0,0 +1,63 @@
+# search_index.py
+from collections import defaultdict
+import pandas as pd
+
+GRAM_SIZE = 3
+
+
+def normalize(value):
+    if pd.isna(value):
+        return None
+    return str(value).upper()
+
+
+def grams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class SubstringIndex:
+    # Trigram index over the distinct values of one column, each value maps to its row labels
+    def __init__(self, series):
+        self._rows = defaultdict(set)
+        self._grams = defaultdict(set)
+        for label, value in series.items():
+            self.add(label, value)
+
+    def add(self, label, value):
+        text = normalize(value)
+        if text is None:
+            return
+        if text not in self._rows:
+            for gram in grams(text):
+                self._grams[gram].add(text)
+        self._rows[text].add(label)
+
+    def remove(self, label, value):
+        text = normalize(value)
+        labels = self._rows.get(text) if text is not None else None
+        if labels is None:
+            return
+        labels.discard(label)
+        if not labels:
+            del self._rows[text]
+            for gram in grams(text):
+                self._grams[gram].discard(text)
+
+    def update(self, label, old_value, new_value):
+        self.remove(label, old_value)
+        self.add(label, new_value)
+
+    def search(self, term):
+        term = normalize(term) or ""
+        if len(term) < GRAM_SIZE:
+            # Too short for trigrams, a literal scan of the distinct values is still cheap
+            candidates = [text for text in self._rows if term in text]
+        else:
+            postings = sorted((self._grams.get(gram, set()) for gram in grams(term)), key=len)
+            candidates = set.intersection(*postings) if postings else set()
+            # Trigrams can match out of order, confirm the real substring
+            candidates = [text for text in candidates if term in text]
+        labels = []
+        for text in candidates:
+            labels.extend(self._rows[text])
+        return pd.Index(sorted(labels))
@@ -0,0 +1,202 @@
+# server.py
+import argparse
+import base64
+import json
+import logging
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bulk_import import import_vehicles
+from dataset import Dataset, VersionConflict
+from journal import Journal, to_json_value
+from remote import DEFAULT_PORT, frame_payload, kpi_payload, table_payload
+from service import fleet_report, insert_vehicle, search_vehicles, stato_history, update_vehicle, update_vehicles
+from storage import SQLiteStorage
+import timing
+
+EXPORT_INTERVAL = 10 * 60
+TIMING_LOG = "server-timing.jsonl"
+
+logger = logging.getLogger("server")
+
+
+def ping(server, request):
+    return {"version": server.dataset.version}
+
+
+def search(server, request):
+    results = search_vehicles(server.dataset, request["column"], request["term"])
+    return {"results": None if results is None else frame_payload(results)}
+
+
+def insert(server, request):
+    return {"inserted": insert_vehicle(server.dataset, request["row"])}
+
+
+def update(server, request):
+    updated = update_vehicle(server.dataset, request["targa"], request["entrata"], request["values"], request.get("version"))
+    return {"updated": updated}
+
+
+def update_many(server, request):
+    edits = {(targa, entrata): values for targa, entrata, values, _ in request["edits"]}
+    versions = {(targa, entrata): version for targa, entrata, _, version in request["edits"]}
+    return {"updated": update_vehicles(server.dataset, edits, versions)}
+
+
+def report(server, request):
+    found = fleet_report(server.dataset, request["flotta"])
+    if found is None:
+        return {"results": None}
+    results, table_data = found
+    return {"results": frame_payload(results), "table_data": table_data}
+
+
+def import_file(server, request):
+    # bulk_import reads by file name, so the upload lands in a file with the same extension
+    suffix = os.path.splitext(request["filename"])[1]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "import" + suffix)
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(request["content"]))
+        imported, rejected = import_vehicles(server.dataset, path)
+    return {"imported": imported, "rejected": table_payload(rejected)}
+
+
+def history(server, request):
+    return {"table": table_payload(stato_history(server.dataset, request["analysis"], request.get("by", "FLOTTA")))}
+
+
+def kpi(server, request):
+    # Loading the frame is what sets the KPI on a fresh start
+    server.dataset.frame()
+    return {"kpi": kpi_payload(server.dataset.kpi)}
+
+
+def recompute(server, request):
+    return {"updated": server.dataset.recompute()}
+
+
+def export(server, request):
+    server.export()
+    return {}
+
+
+ROUTES = {
+    "/ping": ping,
+    "/search": search,
+    "/insert": insert,
+    "/update": update,
+    "/update_many": update_many,
+    "/fleet_report": report,
+    "/import": import_file,
+    "/stato_history": history,
+    "/kpi": kpi,
+    "/recompute": recompute,
+    "/export": export,
+}
+
+
+class DataRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps every client connection open between requests
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        route = ROUTES.get(self.path)
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if route is None:
+                status, body = 404, {"error": f"Unknown path {self.path}"}
+            else:
+                status, body = 200, route(self.server, request)
+        except VersionConflict as e:
+            status, body = 409, {"error": str(e)}
+        except (ValueError, KeyError) as e:
+            status, body = 400, {"error": str(e)}
+        except Exception as e:
+            logger.exception("%s failed", self.path)
+            status, body = 500, {"error": str(e)}
+        data = json.dumps(body, default=to_json_value).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Every call already leaves a record in the timing log
+        pass
+
+
+class DataServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, dataset, excel_path):
+        super().__init__(address, DataRequestHandler)
+        self.dataset = dataset
+        self.excel_path = excel_path
+        self.exported_version = dataset.version
+        self.export_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def export(self):
+        with self.export_lock:
+            version = self.dataset.version
+            self.dataset.export_excel(self.excel_path)
+            self.exported_version = version
+
+    def start_exports(self, interval=EXPORT_INTERVAL):
+        def run():
+            while not self._stop.wait(interval):
+                if self.dataset.version != self.exported_version:
+                    try:
+                        self.export()
+                    except ValueError:
+                        logger.exception("Export to %s refused", self.excel_path)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def server_close(self):
+        self._stop.set()
+        super().server_close()
+
+
+def open_server(host, port, data_path, journal_path, excel_path):
+    dataset = Dataset(SQLiteStorage(data_path), Journal(journal_path))
+    if dataset.storage.needs_migration():
+        with timing.timed("migrate"):
+            dataset.storage.migrate_from_excel(excel_path)
+    dataset.compact()
+    dataset.start_compaction()
+    dataset.build_indexes()
+    return DataServer((host, port), dataset, excel_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hold the dataset in memory and serve it to every workstation")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to accept the other workstations")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data", default="data.db")
+    parser.add_argument("--journal", default="data.journal")
+    parser.add_argument("--excel", default="data.xlsx")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    timing.configure(TIMING_LOG)
+    server = open_server(args.host, args.port, args.data, args.journal, args.excel)
+    server.start_exports()
+    logger.info("Serving %s on %s:%s", args.data, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.dataset.version != server.exported_version:
+            server.export()
+        server.dataset.close()
+
+
+if __name__ == "__main__":
+    main()
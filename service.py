@@ -0,0 +1,140 @@
+# service.py
+from datetime import datetime, timedelta
+from functools import wraps
+import pandas as pd
+from dataset import VersionConflict
+from remote import RemoteDataset
+from schema import COLUMNS, DATE_FORMAT, EDITABLE_LABELS, apply_schema, storage_frame, to_storage_row
+from recompute import DERIVED_COLUMNS, recompute_derived
+from timing import timed
+from stato_history import queue_lengths, time_in_state, weekly_throughput
+from reports import build_table_data, write_pdf, write_excel
+
+
+def new_vehicle_row(data):
+    # Blank derived fields, PREV.USCITA ten days after ENTRATA; raises ValueError on a bad date
+    row = {col: '' for col in COLUMNS}
+    row.update(data)
+    if row["ENTRATA"] == '':
+        row["ENTRATA"] = None
+    else:
+        entrata_date = datetime.strptime(row["ENTRATA"], DATE_FORMAT)
+        row["PREV.USCITA"] = (entrata_date + timedelta(days=10)).strftime(DATE_FORMAT)
+    return {col: row[col] for col in COLUMNS}
+
+
+def served(fn):
+    # On a thin client the same call is answered by the data server
+    @wraps(fn)
+    def call(dataset, *args, **kwargs):
+        if isinstance(dataset, RemoteDataset):
+            return getattr(dataset, fn.__name__)(*args, **kwargs)
+        return fn(dataset, *args, **kwargs)
+    return call
+
+
+@timed("insert_vehicle")
+@served
+def insert_vehicle(dataset, row):
+    if dataset.contains(row["TARGA"], row["ENTRATA"]):
+        return False
+    dataset.insert(row)
+    return True
+
+
+@timed("search_vehicles")
+@served
+def search_vehicles(dataset, column, term):
+    # VERSIONE goes back with an edit of the row, see Dataset.update
+    if not dataset.exists():
+        return None
+    with dataset.lock:
+        results = dataset.search(column, term)
+        return results.assign(VERSIONE=dataset.row_versions(results))
+
+
+def edited_values(values, calendar=None):
+    # One row through edited_frame, so the editor and a bulk commit follow the same rules
+    row = edited_frame(pd.DataFrame([values]), calendar).iloc[0]
+    return to_storage_row(row[list(dict.fromkeys(list(values) + DERIVED_COLUMNS))])
+
+
+@timed("update_vehicle")
+@served
+def update_vehicle(dataset, targa, entrata, values, version=None):
+    if not dataset.exists():
+        return False
+    index = dataset.find(targa, entrata)
+    if index.empty:
+        # Most likely another workstation corrected the key since this row was read
+        raise VersionConflict(f"{targa} {entrata} is no longer in the data, search it again")
+    dataset.update(index[0], values, version)
+    return True
+
+
+@timed("update_math")
+def edited_frame(rows, calendar=None):
+    # INIZIO/FINE CARR are blanked without body parts to paint, raises ValueError on a bad date
+    rows = apply_schema(rows, errors="raise")
+    rows.loc[rows["PZ CARR"].fillna(0) == 0, ["INIZIO CARR", "FINE CARR"]] = pd.NaT
+    return recompute_derived(rows, calendar)
+
+
+@timed("update_vehicles")
+@served
+def update_vehicles(dataset, edits, versions=None):
+    # edits maps (TARGA, ENTRATA) to the fields typed for that row, versions to the VERSIONE it was read at
+    if not dataset.exists() or not edits:
+        return 0
+    with dataset.lock:
+        df = dataset.frame()
+        labels = dataset.labels(edits)
+        found = [label is not None for label in labels]
+        if versions is not None and not all(found):
+            targa, entrata = next(key for key, hit in zip(edits, found) if not hit)
+            raise VersionConflict(f"{targa} {entrata} is no longer in the data, search it again")
+        labels = pd.Index([label for label in labels if label is not None], dtype="int64")
+        if labels.empty:
+            return 0
+        rows = storage_frame(df.loc[labels]).astype(object)
+        for label, values in zip(labels, [values for values, hit in zip(edits.values(), found) if hit]):
+            for col, value in values.items():
+                rows.at[label, col] = value
+        rows = edited_frame(rows, dataset.calendar)
+        if versions is not None:
+            versions = [versions.get(key) for key, hit in zip(edits, found) if hit]
+        dataset.update_many(labels, rows[EDITABLE_LABELS + DERIVED_COLUMNS].to_dict("records"), versions)
+    return len(labels)
+
+
+@timed("stato_history")
+@served
+def stato_history(dataset, analysis, by="FLOTTA"):
+    events = dataset.stato_events()
+    if analysis == "time_in_state":
+        return time_in_state(events, dataset.frame(), by)
+    if analysis == "queues":
+        return queue_lengths(events, dataset.frame(), by)
+    return weekly_throughput(events)
+
+
+def recompute(dataset):
+    return dataset.recompute()
+
+
+@timed("fleet_report")
+@served
+def fleet_report(dataset, flotta):
+    results = search_vehicles(dataset, "FLOTTA", flotta)
+    if results is None:
+        return None
+    table_data = build_table_data(results) if not results.empty else None
+    return results, table_data
+
+
+@timed("export_fleet_report")
+def export_fleet_report(flotta, results, table_data, pdf_path=None, excel_path=None):
+    if pdf_path is not None:
+        write_pdf(pdf_path, flotta, table_data, len(results["TARGA"].unique()))
+    if excel_path is not None:
+        write_excel(excel_path, flotta, table_data)
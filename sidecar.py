@@ -0,0 +1,99 @@
+# sidecar.py
+import hashlib
+import json
+import os
+import pandas as pd
+from excel_writer import write_frame
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+
+def sidecar_paths(xlsx_path):
+    base = os.path.splitext(xlsx_path)[0]
+    return base + ".feather", base + ".pkl", base + ".sidecar.json"
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _load_cache(xlsx_path, meta):
+    feather_path, pickle_path, _ = sidecar_paths(xlsx_path)
+    if meta["format"] == "feather" and feather is not None and os.path.exists(feather_path):
+        return feather.read_feather(feather_path, memory_map=True)
+    if meta["format"] == "pickle" and os.path.exists(pickle_path):
+        return pd.read_pickle(pickle_path)
+    return None
+
+
+def write_cache(xlsx_path, df, digest=None):
+    feather_path, pickle_path, meta_path = sidecar_paths(xlsx_path)
+    stat = os.stat(xlsx_path)
+    fmt = "pickle"
+    if feather is not None:
+        try:
+            feather.write_feather(df.reset_index(drop=True), feather_path + ".tmp")
+            os.replace(feather_path + ".tmp", feather_path)
+            fmt = "feather"
+        except (TypeError, ValueError):
+            # Arrow refuses object columns that mix numbers and text, pickle takes anything
+            if os.path.exists(feather_path + ".tmp"):
+                os.remove(feather_path + ".tmp")
+    if fmt == "pickle":
+        df.to_pickle(pickle_path + ".tmp")
+        os.replace(pickle_path + ".tmp", pickle_path)
+    _write_meta(meta_path, {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": digest or file_digest(xlsx_path),
+        "format": fmt,
+    })
+
+
+def read_workbook(xlsx_path):
+    # The columnar sidecar is trusted while the workbook keeps its mtime/size, or its hash after a touch
+    _, _, meta_path = sidecar_paths(xlsx_path)
+    meta = _read_meta(meta_path)
+    stat = os.stat(xlsx_path)
+    if meta is not None and meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+        df = _load_cache(xlsx_path, meta)
+        if df is not None:
+            return df
+
+    digest = file_digest(xlsx_path)
+    if meta is not None and meta["sha256"] == digest:
+        df = _load_cache(xlsx_path, meta)
+        if df is not None:
+            _write_meta(meta_path, {**meta, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+            return df
+
+    df = pd.read_excel(xlsx_path)
+    write_cache(xlsx_path, df, digest)
+    return df
+
+
+def write_workbook(xlsx_path, df):
+    write_frame(xlsx_path, df)
+    write_cache(xlsx_path, df)
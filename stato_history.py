@@ -0,0 +1,91 @@
+# stato_history.py
+from datetime import datetime
+import pandas as pd
+from schema import KEY_COLUMNS, parse_dates, stato_dtype, to_storage_value
+
+EVENT_COLUMNS = ["TARGA", "ENTRATA", "STATO", "TIMESTAMP"]
+DAY = pd.Timedelta(days=1)
+
+
+def stato_events(old_rows, new_rows):
+    # One event per row whose STATO is new or differs from before, keyed on the row as it is now
+    old_stato = old_rows["STATO"].astype(object).reindex(new_rows.index)
+    new_stato = new_rows["STATO"].astype(object)
+    changed = new_stato.notna() & (old_stato.isna() | (old_stato != new_stato))
+    if not changed.any():
+        return []
+    timestamp = datetime.now().isoformat(timespec="microseconds")
+    rows = new_rows.loc[changed, KEY_COLUMNS].astype(object)
+    rows["ENTRATA"] = rows["ENTRATA"].map(to_storage_value)
+    rows["STATO"] = new_stato[changed]
+    rows["TIMESTAMP"] = timestamp
+    return rows[EVENT_COLUMNS].to_dict("records")
+
+
+def key_changes(old_rows, new_rows):
+    # [old TARGA, old ENTRATA, TARGA, ENTRATA] of every row whose key an edit corrected
+    changes = []
+    for label in old_rows.index:
+        old = [to_storage_value(old_rows.at[label, col]) for col in KEY_COLUMNS]
+        new = [to_storage_value(new_rows.at[label, col]) for col in KEY_COLUMNS]
+        if old != new and None not in old:
+            changes.append(old + new)
+    return changes
+
+
+def rekey_events(events, changes):
+    # The history follows the vehicle to its corrected key
+    events = events.copy()
+    for old_targa, old_entrata, targa, entrata in changes:
+        moved = (events["TARGA"] == old_targa) & (events["ENTRATA"] == old_entrata)
+        events.loc[moved, "TARGA"] = targa
+        events.loc[moved, "ENTRATA"] = entrata
+    return events
+
+
+def event_frame(events):
+    # The same event can be read from the store and the journal while a batch is being compacted
+    events = events[EVENT_COLUMNS].drop_duplicates()
+    events["ENTRATA"] = parse_dates(events["ENTRATA"])
+    events["STATO"] = events["STATO"].astype(stato_dtype(events["STATO"].dropna().unique()))
+    events["TIMESTAMP"] = pd.to_datetime(events["TIMESTAMP"], format="ISO8601")
+    return events.sort_values(KEY_COLUMNS + ["TIMESTAMP"], kind="stable", ignore_index=True)
+
+
+def state_spells(events, now=None):
+    # Each event opens a spell that the next event of the same vehicle closes, the last one is still running
+    now = pd.Timestamp(now or datetime.now())
+    ended = events.groupby(KEY_COLUMNS, sort=False, dropna=False)["TIMESTAMP"].shift(-1)
+    spells = events.assign(FINE=ended.fillna(now), APERTO=ended.isna())
+    spells["GIORNI"] = (spells["FINE"] - spells["TIMESTAMP"]) / DAY
+    return spells
+
+
+def with_groups(spells, df, by):
+    groups = df[KEY_COLUMNS + [by]].drop_duplicates(KEY_COLUMNS)
+    return spells.merge(groups, on=KEY_COLUMNS, how="left")
+
+
+def time_in_state(events, df, by="FLOTTA", now=None):
+    if events.empty:
+        return pd.DataFrame(columns=[by, "STATO", "N", "MEDIA", "P50", "P90", "MAX"])
+    spells = with_groups(state_spells(events, now), df, by)
+    stats = spells.groupby([by, "STATO"], observed=True, dropna=False)["GIORNI"].describe(percentiles=[0.5, 0.9])
+    stats = stats.rename(columns={"count": "N", "mean": "MEDIA", "50%": "P50", "90%": "P90", "max": "MAX"})
+    return stats[["N", "MEDIA", "P50", "P90", "MAX"]].round(2).reset_index()
+
+
+def queue_lengths(events, df=None, by=None):
+    # The latest event of every vehicle is the queue it is waiting in now
+    current = events.drop_duplicates(KEY_COLUMNS, keep="last")
+    if by is None:
+        return current["STATO"].value_counts(sort=False).rename("VEICOLI").reset_index()
+    current = with_groups(current, df, by)
+    return current.groupby([by, "STATO"], observed=True, dropna=False).size().rename("VEICOLI").reset_index()
+
+
+def weekly_throughput(events):
+    # Vehicles entering each STATO per ISO week, PRONTA being the workshop output
+    week = events["TIMESTAMP"].dt.to_period("W").rename("SETTIMANA")
+    table = events.groupby([week, events["STATO"]], observed=False).size().unstack("STATO", fill_value=0)
+    return table.reset_index()
@@ -0,0 +1,219 @@
+# storage.py
+import os
+import sqlite3
+import threading
+import pandas as pd
+from schema import COLUMNS, KEY_COLUMNS, storage_frame, to_storage_value
+from kpi import KPI_INDEX
+from stato_history import EVENT_COLUMNS
+from sidecar import read_workbook, write_workbook
+
+INDEXED_COLUMNS = ["FLOTTA", "STATO", "DITTA"]
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ExcelStorage:
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def exists(self):
+        return os.path.exists(self.file_path)
+
+    def signature(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        if not self.exists():
+            return pd.DataFrame(columns=COLUMNS)
+        return read_workbook(self.file_path)
+
+    # The workbook has no row-level writes, every batch of changes rewrites the whole frame
+    def apply(self, df, changes, kpi_delta=None):
+        self.write(df)
+
+    # Nowhere to keep the KPI next to a workbook, it is aggregated again on every load
+    def load_kpi(self):
+        return None
+
+    def load_events(self):
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    def load_versions(self):
+        return pd.DataFrame(columns=KEY_COLUMNS + ["VERSIONE"])
+
+    def journal_seq(self):
+        return 0
+
+    def save_kpi(self, kpi):
+        pass
+
+    def write(self, df):
+        write_workbook(self.file_path, storage_frame(df))
+
+
+class SQLiteStorage:
+    def __init__(self, db_path, read_only=False):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        if read_only:
+            # Never creates the file nor any table, a missing database is an error
+            self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.create_schema()
+
+    def create_schema(self):
+        columns = ", ".join(quote(col) for col in COLUMNS)
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS vehicles (id INTEGER PRIMARY KEY, {columns}, VERSIONE INTEGER NOT NULL DEFAULT 0)")
+            if not self._has_column("vehicles", "VERSIONE"):
+                self.conn.execute("ALTER TABLE vehicles ADD COLUMN VERSIONE INTEGER NOT NULL DEFAULT 0")
+            key = ", ".join(quote(col) for col in KEY_COLUMNS)
+            self.conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_vehicles_key ON vehicles ({key})")
+            for col in INDEXED_COLUMNS:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_vehicles_{col.lower()} ON vehicles ({quote(col)})")
+            # Append-only, the unique index makes a replayed journal batch a no-op
+            self.conn.execute("CREATE TABLE IF NOT EXISTS stato_events (TARGA, ENTRATA, STATO, TIMESTAMP)")
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_stato_events ON stato_events (TARGA, ENTRATA, TIMESTAMP, STATO)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS fleet_kpi (DIMENSIONE, GRUPPO, METRICA, VALORE INTEGER, PRIMARY KEY (DIMENSIONE, GRUPPO, METRICA))"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS store_meta (NOME TEXT PRIMARY KEY, VALORE)")
+
+    def exists(self):
+        return os.path.exists(self.db_path)
+
+    def has_table(self, name):
+        # A database from before the KPI and STATO history tables, opened read-only
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", [name]).fetchone() is not None
+
+    def _has_column(self, table, name):
+        return any(row[1] == name for row in self.conn.execute(f"PRAGMA table_info({table})"))
+
+    def signature(self):
+        # data_version only changes when another connection commits to the file
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self):
+        columns = ", ".join(quote(col) for col in COLUMNS)
+        with self.lock:
+            return pd.read_sql_query(f"SELECT {columns} FROM vehicles ORDER BY id", self.conn)
+
+    def apply(self, df, changes, kpi_delta=None):
+        # The whole batch is one transaction, a replayed insert that already landed is ignored
+        with self.lock, self.conn:
+            if kpi_delta is not None:
+                self._add_kpi(kpi_delta)
+            for change in changes:
+                # A corrected key takes the vehicle's history with it, before the change logs anything new
+                for old_targa, old_entrata, targa, entrata in change.get("rekey", []):
+                    self.conn.execute(
+                        "UPDATE OR IGNORE stato_events SET TARGA = ?, ENTRATA = ? WHERE TARGA IS ? AND ENTRATA IS ?",
+                        [targa, entrata, old_targa, old_entrata],
+                    )
+                    self.conn.execute("DELETE FROM stato_events WHERE TARGA IS ? AND ENTRATA IS ?", [old_targa, old_entrata])
+                if change.get("events"):
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO stato_events VALUES (?, ?, ?, ?)",
+                        [[event[col] for col in EVENT_COLUMNS] for event in change["events"]],
+                    )
+                if change["op"] in ("insert", "insert_many"):
+                    rows = change["rows"] if change["op"] == "insert_many" else [change["row"]]
+                    columns = [col for col in COLUMNS if col in rows[0]]
+                    placeholders = ", ".join("?" for _ in columns)
+                    self.conn.executemany(
+                        f"INSERT OR IGNORE INTO vehicles ({', '.join(quote(col) for col in columns)}) VALUES ({placeholders})",
+                        [[to_storage_value(row.get(col)) for col in columns] for row in rows],
+                    )
+                else:
+                    for update in change["updates"] if change["op"] == "update_many" else [change]:
+                        values = update["values"]
+                        assignments = ", ".join(f"{quote(col)} = ?" for col in values)
+                        self.conn.execute(
+                            f"UPDATE vehicles SET {assignments} WHERE TARGA IS ? AND ENTRATA IS ?",
+                            [to_storage_value(value) for value in values.values()] + [to_storage_value(part) for part in update["key"]],
+                        )
+                # Edit counters, on the key each row has after the change
+                self.conn.executemany(
+                    "UPDATE vehicles SET VERSIONE = ? WHERE TARGA IS ? AND ENTRATA IS ?",
+                    [[version, targa, entrata] for targa, entrata, version in change.get("versions", [])],
+                )
+            # Last journal record in the store, committed with the batch
+            seqs = [change["seq"] for change in changes if "seq" in change]
+            if seqs:
+                self.conn.execute("INSERT OR REPLACE INTO store_meta (NOME, VALORE) VALUES ('journal_seq', ?)", [max(seqs)])
+
+    def _add_kpi(self, delta):
+        # The KPI rows move by the same deltas as the vehicles, in the same transaction
+        self.conn.executemany(
+            "INSERT INTO fleet_kpi VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (DIMENSIONE, GRUPPO, METRICA) DO UPDATE SET VALORE = VALORE + excluded.VALORE",
+            [key + (int(value),) for key, value in delta.items()],
+        )
+        self.conn.execute("DELETE FROM fleet_kpi WHERE VALORE = 0")
+
+    def load_versions(self):
+        # Only the rows edited at least once, a database from before the column has none
+        with self.lock:
+            if not self._has_column("vehicles", "VERSIONE"):
+                return pd.DataFrame(columns=KEY_COLUMNS + ["VERSIONE"])
+            return pd.read_sql_query("SELECT TARGA, ENTRATA, VERSIONE FROM vehicles WHERE VERSIONE > 0", self.conn)
+
+    def load_events(self):
+        if not self.has_table("stato_events"):
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+        with self.lock:
+            return pd.read_sql_query("SELECT TARGA, ENTRATA, STATO, TIMESTAMP FROM stato_events", self.conn)
+
+    def load_kpi(self):
+        # None when the vehicles were never aggregated, e.g. a database from before the KPI table
+        if not self.has_table("fleet_kpi"):
+            return None
+        with self.lock:
+            kpi = pd.read_sql_query("SELECT DIMENSIONE, GRUPPO, METRICA, VALORE FROM fleet_kpi", self.conn)
+            if kpi.empty and self.conn.execute("SELECT EXISTS (SELECT 1 FROM vehicles)").fetchone()[0]:
+                return None
+        return kpi.set_index(KPI_INDEX)["VALORE"].astype("int64")
+
+    def save_kpi(self, kpi):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM fleet_kpi")
+            self._add_kpi(kpi)
+
+    def journal_seq(self):
+        if not self.has_table("store_meta"):
+            return 0
+        with self.lock:
+            row = self.conn.execute("SELECT VALORE FROM store_meta WHERE NOME = 'journal_seq'").fetchone()
+        return 0 if row is None else row[0]
+
+    def needs_migration(self):
+        # The marker commits together with the migrated rows, a migration that failed halfway left neither
+        with self.lock:
+            marked = self.conn.execute("SELECT 1 FROM store_meta WHERE NOME = 'migrated'").fetchone()
+            filled = self.conn.execute("SELECT EXISTS (SELECT 1 FROM vehicles)").fetchone()[0]
+        return marked is None and not filled
+
+    def migrate_from_excel(self, file_path):
+        # Without a legacy workbook there is nothing to bring over, only the marker is written
+        df = read_workbook(file_path) if os.path.exists(file_path) else pd.DataFrame(columns=COLUMNS)
+        columns = [col for col in COLUMNS if col in df.columns]
+        placeholders = ", ".join("?" for _ in columns)
+        rows = [[to_storage_value(value) for value in row] for row in df[columns].itertuples(index=False)]
+        # Legacy workbooks may already hold duplicated (TARGA, ENTRATA) pairs, keep the first one
+        with self.lock, self.conn:
+            cursor = self.conn.executemany(
+                f"INSERT OR IGNORE INTO vehicles ({', '.join(quote(col) for col in columns)}) VALUES ({placeholders})",
+                rows,
+            )
+            self.conn.execute("INSERT OR REPLACE INTO store_meta (NOME, VALORE) VALUES ('migrated', ?)", [file_path])
+        return cursor.rowcount
@@ -0,0 +1,99 @@
+# tasks.py
+import tkinter as tk
+from tkinter import messagebox, ttk
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL_MS = 50
+SEARCH_DEBOUNCE_MS = 250
+
+# Shared by every window, so all I/O and report building stays off the Tk event thread
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="task")
+
+
+def bind_live_search(entry, search):
+    # Filter live while typing, but only once the user pauses; search(live=True) runs on the Tk thread
+    scheduled = None
+
+    def on_key_release(event):
+        nonlocal scheduled
+        if scheduled is not None:
+            entry.after_cancel(scheduled)
+        scheduled = entry.after(SEARCH_DEBOUNCE_MS, run)
+
+    def run():
+        nonlocal scheduled
+        scheduled = None
+        search(True)
+
+    entry.bind("<KeyRelease>", on_key_release)
+
+
+class StatusBar(tk.Frame):
+    def __init__(self, master):
+        super().__init__(master)
+        self.label = tk.Label(self, anchor="w")
+        self.label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.progress = ttk.Progressbar(self, mode="indeterminate", length=100)
+        self.progress.pack(side=tk.RIGHT, padx=5)
+
+    def set(self, message, busy=False):
+        self.label.config(text=message)
+        if busy:
+            self.progress.start(10)
+        else:
+            self.progress.stop()
+
+
+class TaskRunner:
+    def __init__(self, root, status_bar=None):
+        self.root = root
+        self.status_bar = status_bar
+        self._futures = {}
+        self._generations = {}
+
+    def busy(self, key):
+        future = self._futures.get(key)
+        return future is not None and not future.done()
+
+    def submit(self, key, fn, *args, on_done=None, on_error=None, message="", supersede=False, warn_busy=False):
+        if self.busy(key):
+            if not supersede:
+                # A write with the same key is still in flight, ignore the double click.
+                # None tells the caller nothing was submitted, so it leaves its buttons as they are
+                if warn_busy:
+                    messagebox.showinfo("Info", "Wait for the current operation to finish")
+                return None
+            self._futures[key].cancel()
+
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        future = _executor.submit(fn, *args)
+        self._futures[key] = future
+        self._set_status(message, True)
+        self.root.after(POLL_INTERVAL_MS, self._poll, key, generation, future, on_done, on_error)
+        return future
+
+    def _poll(self, key, generation, future, on_done, on_error):
+        if not self.root.winfo_exists():
+            return
+        if not future.done():
+            self.root.after(POLL_INTERVAL_MS, self._poll, key, generation, future, on_done, on_error)
+            return
+        if self._generations.get(key) != generation or future.cancelled():
+            # Superseded by a newer task with the same key, its result is stale
+            return
+
+        del self._futures[key]
+        self._set_status("", any(self.busy(other) for other in self._futures))
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            else:
+                messagebox.showerror("Error", str(error))
+        elif on_done is not None:
+            on_done(future.result())
+
+    def _set_status(self, message, busy):
+        if self.status_bar is not None:
+            self.status_bar.set(message, busy)
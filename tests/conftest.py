@@ -0,0 +1,35 @@
+# tests/conftest.py
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import Dataset  # noqa: E402
+from journal import Journal  # noqa: E402
+from service import new_vehicle_row  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+
+@pytest.fixture
+def vehicle():
+    def make(targa, entrata="04/03/2024", **values):
+        data = {"FLOTTA": "ALD", "TARGA": targa, "MODELLO": "PANDA", "ENTRATA": entrata, "DITTA": "ROSSI",
+                "PZ CARR": 2, "STATO": "ATT.PERZ.", "RICAMBI": "NO"}
+        return new_vehicle_row({**data, **values})
+    return make
+
+
+@pytest.fixture
+def open_dataset(tmp_path):
+    # Opening the same files again is a restart, without close() it is one after a crash
+    opened = []
+
+    def open_():
+        dataset = Dataset(SQLiteStorage(str(tmp_path / "data.db")), Journal(str(tmp_path / "data.journal")))
+        opened.append(dataset)
+        return dataset
+
+    yield open_
+    for dataset in opened:
+        dataset.journal.close()
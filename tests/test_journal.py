@@ -0,0 +1,52 @@
+# tests/test_journal.py
+import json
+from journal import Journal, read_records
+from service import insert_vehicle, update_vehicle
+
+
+def stored_targhe(dataset):
+    return dataset.storage.load()["TARGA"].tolist()
+
+
+def test_replay_after_a_crash(open_dataset, vehicle):
+    dataset = open_dataset()
+    insert_vehicle(dataset, vehicle("AA111AA"))
+    insert_vehicle(dataset, vehicle("BB222BB"))
+    update_vehicle(dataset, "AA111AA", "04/03/2024", {"STATO": "PRONTA"})
+
+    dataset = open_dataset()
+    assert stored_targhe(dataset) == []
+    df = dataset.frame().set_index("TARGA")
+    assert df["STATO"].astype(str).to_dict() == {"AA111AA": "PRONTA", "BB222BB": "ATT.PERZ."}
+
+    dataset.compact()
+    assert stored_targhe(dataset) == ["AA111AA", "BB222BB"]
+    assert read_records(dataset.journal.path) == []
+
+
+def test_replay_of_a_batch_already_in_the_store(open_dataset, vehicle):
+    dataset = open_dataset()
+    insert_vehicle(dataset, vehicle("AA111AA"))
+    update_vehicle(dataset, "AA111AA", "04/03/2024", {"TARGA": "AA111AB"})
+    # Crash between the store transaction and the journal truncate
+    dataset.storage.apply(dataset.frame(), dataset.journal.records())
+
+    dataset = open_dataset()
+    assert dataset.frame()["TARGA"].tolist() == ["AA111AB"]
+    dataset.compact()
+    assert stored_targhe(dataset) == ["AA111AB"]
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    path = str(tmp_path / "data.journal")
+    journal = Journal(path)
+    journal.append({"op": "insert", "row": {"TARGA": "AA111AA"}})
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "insert", "row": {"TARGA": "BB222BB"}})[:20])
+    assert [record["row"]["TARGA"] for record in read_records(path)] == ["AA111AA"]
+
+    journal = Journal(path)
+    journal.append({"op": "insert", "row": {"TARGA": "CC333CC"}})
+    journal.close()
+    assert [record["row"]["TARGA"] for record in read_records(path)] == ["AA111AA", "CC333CC"]
@@ -0,0 +1,77 @@
+# tests/test_kpi.py
+from kpi import kpi_contribution
+from schema import apply_schema
+from service import insert_vehicle, update_vehicle, update_vehicles
+
+
+def as_dict(kpi):
+    return kpi[kpi != 0].to_dict()
+
+
+def assert_consistent(dataset):
+    # The KPI kept by deltas, the one in the store and the one aggregated from the rows all agree
+    expected = as_dict(kpi_contribution(dataset.frame()))
+    assert as_dict(dataset.kpi) == expected
+    dataset.compact()
+    assert as_dict(dataset.storage.load_kpi()) == expected
+
+
+def fill(dataset, vehicle):
+    insert_vehicle(dataset, vehicle("AA111AA"))
+    insert_vehicle(dataset, vehicle("BB222BB", FLOTTA="LEASYS", STATO="LAV.CAR1"))
+    insert_vehicle(dataset, vehicle("CC333CC", DITTA="BIANCHI"))
+    # Edited like in the search window, the day counts are computed with the dates
+    update_vehicles(dataset, {("AA111AA", "04/03/2024"): {"INIZIO.MECC": "05/03/2024", "FINE MECC": "12/03/2024"}})
+
+
+def test_kpi_follows_edits(open_dataset, vehicle):
+    dataset = open_dataset()
+    fill(dataset, vehicle)
+    assert_consistent(dataset)
+
+    update_vehicle(dataset, "AA111AA", "04/03/2024", {"STATO": "PRONTA"})
+    update_vehicle(dataset, "BB222BB", "04/03/2024", {"TARGA": "BB222BC", "FLOTTA": "ALD"})
+    update_vehicles(dataset, {("CC333CC", "04/03/2024"): {"DITTA": "ROSSI", "STATO": "FIN"}})
+    assert_consistent(dataset)
+    assert dataset.kpi[("FLOTTA", "ALD", "VEICOLI")] == 3
+
+
+def test_kpi_survives_a_restart(open_dataset, vehicle):
+    dataset = open_dataset()
+    fill(dataset, vehicle)
+    update_vehicle(dataset, "CC333CC", "04/03/2024", {"FLOTTA": "LEASYS"})
+    kpi = as_dict(dataset.kpi)
+
+    # Not compacted, the journal replay brings the KPI back
+    dataset = open_dataset()
+    dataset.frame()
+    assert as_dict(dataset.kpi) == kpi
+    assert_consistent(dataset)
+
+    dataset.close()
+    dataset = open_dataset()
+    dataset.frame()
+    assert as_dict(dataset.kpi) == kpi
+
+
+def test_stale_day_counts_are_written_back(open_dataset, vehicle):
+    dataset = open_dataset()
+    fill(dataset, vehicle)
+    dataset.close()
+    # Day counts stored by an older version of the app, with a KPI aggregated from them
+    dataset.storage.conn.execute('UPDATE vehicles SET "DOWN TIME" = 40 WHERE TARGA = ?', ["AA111AA"])
+    dataset.storage.conn.commit()
+    dataset.storage.save_kpi(kpi_contribution(apply_schema(dataset.storage.load())))
+
+    dataset = open_dataset()
+    assert dataset.frame().set_index("TARGA").at["AA111AA", "DOWN TIME"] == 6
+    assert_consistent(dataset)
+    assert dataset.storage.load().set_index("TARGA").at["AA111AA", "DOWN TIME"] == 6
+
+
+def test_recompute_keeps_the_kpi(open_dataset, vehicle):
+    dataset = open_dataset()
+    fill(dataset, vehicle)
+    update_vehicle(dataset, "AA111AA", "04/03/2024", {"DOWN TIME": 40})
+    assert dataset.recompute() == 1
+    assert_consistent(dataset)
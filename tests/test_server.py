@@ -0,0 +1,111 @@
+# tests/test_server.py
+import threading
+import pytest
+from dataset import VersionConflict
+from remote import RemoteDataset
+from server import open_server
+from service import insert_vehicle, search_vehicles, update_vehicle, update_vehicles
+
+
+@pytest.fixture
+def serve(tmp_path):
+    # Starting again on the same files is a restart of the server
+    running = []
+
+    def start():
+        server = open_server("127.0.0.1", 0, str(tmp_path / "data.db"), str(tmp_path / "data.journal"), str(tmp_path / "data.xlsx"))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = RemoteDataset(f"127.0.0.1:{server.server_address[1]}")
+        running.append((server, client))
+        return server, client
+
+    yield start
+    for server, client in running:
+        stop(server, client)
+
+
+def stop(server, client):
+    # Safe to repeat, the fixture stops again whatever a test already stopped
+    client.close()
+    server.shutdown()
+    server.server_close()
+    server.dataset.close()
+
+
+def found(client, targa):
+    return search_vehicles(client, "TARGA", targa).set_index("TARGA")
+
+
+def test_insert_and_search(serve, vehicle):
+    _, client = serve()
+    assert insert_vehicle(client, vehicle("AA111AA"))
+    assert not insert_vehicle(client, vehicle("AA111AA"))
+    rows = found(client, "AA111")
+    assert rows.index.tolist() == ["AA111AA"]
+    assert rows.at["AA111AA", "VERSIONE"] == 0
+    assert rows.at["AA111AA", "ENTRATA"].strftime("%d/%m/%Y") == "04/03/2024"
+
+
+def test_update_bumps_version(serve, vehicle):
+    _, client = serve()
+    insert_vehicle(client, vehicle("AA111AA"))
+    assert update_vehicle(client, "AA111AA", "04/03/2024", {"STATO": "PRONTA"}, 0)
+    rows = found(client, "AA111AA")
+    assert rows.at["AA111AA", "STATO"] == "PRONTA"
+    assert rows.at["AA111AA", "VERSIONE"] == 1
+
+
+def test_stale_version_is_a_conflict(serve, vehicle):
+    _, client = serve()
+    other = RemoteDataset(f"{client.host}:{client.port}")
+    insert_vehicle(client, vehicle("AA111AA"))
+    update_vehicle(client, "AA111AA", "04/03/2024", {"STATO": "PRONTA"}, 0)
+    with pytest.raises(VersionConflict):
+        update_vehicle(other, "AA111AA", "04/03/2024", {"STATO": "FIN"}, 0)
+    other.close()
+    assert found(client, "AA111AA").at["AA111AA", "STATO"] == "PRONTA"
+
+
+def test_corrected_key_is_a_conflict(serve, vehicle):
+    _, client = serve()
+    insert_vehicle(client, vehicle("AA111AA"))
+    update_vehicle(client, "AA111AA", "04/03/2024", {"TARGA": "AA111AB"}, 0)
+    with pytest.raises(VersionConflict):
+        update_vehicle(client, "AA111AA", "04/03/2024", {"STATO": "FIN"}, 0)
+    assert found(client, "AA111").index.tolist() == ["AA111AB"]
+
+
+def test_bulk_edit(serve, vehicle):
+    _, client = serve()
+    for targa in ["AA111AA", "BB222BB", "CC333CC"]:
+        insert_vehicle(client, vehicle(targa))
+    update_vehicle(client, "BB222BB", "04/03/2024", {"DITTA": "BIANCHI"}, 0)
+    edits = {(targa, "04/03/2024"): {"STATO": "LAV.CAR1"} for targa in ["AA111AA", "BB222BB"]}
+    versions = {("AA111AA", "04/03/2024"): 0, ("BB222BB", "04/03/2024"): 1}
+    assert update_vehicles(client, edits, versions) == 2
+    rows = found(client, "")
+    assert rows["STATO"].astype(str).to_dict() == {"AA111AA": "LAV.CAR1", "BB222BB": "LAV.CAR1", "CC333CC": "ATT.PERZ."}
+    assert rows["DITTA"].astype(str).to_dict() == {"AA111AA": "ROSSI", "BB222BB": "BIANCHI", "CC333CC": "ROSSI"}
+    assert rows["VERSIONE"].to_dict() == {"AA111AA": 1, "BB222BB": 2, "CC333CC": 0}
+
+
+def test_stale_bulk_edit_changes_nothing(serve, vehicle):
+    _, client = serve()
+    for targa in ["AA111AA", "BB222BB"]:
+        insert_vehicle(client, vehicle(targa))
+    update_vehicle(client, "BB222BB", "04/03/2024", {"STATO": "FIN"}, 0)
+    edits = {(targa, "04/03/2024"): {"STATO": "PRONTA"} for targa in ["AA111AA", "BB222BB"]}
+    with pytest.raises(VersionConflict):
+        update_vehicles(client, edits, {key: 0 for key in edits})
+    assert found(client, "")["STATO"].astype(str).to_dict() == {"AA111AA": "ATT.PERZ.", "BB222BB": "FIN"}
+
+
+def test_versions_survive_a_restart(serve, vehicle):
+    server, client = serve()
+    insert_vehicle(client, vehicle("AA111AA"))
+    update_vehicle(client, "AA111AA", "04/03/2024", {"STATO": "PRONTA"}, 0)
+    stop(server, client)
+    _, client = serve()
+    assert found(client, "AA111AA").at["AA111AA", "VERSIONE"] == 1
+    with pytest.raises(VersionConflict):
+        update_vehicle(client, "AA111AA", "04/03/2024", {"STATO": "FIN"}, 0)
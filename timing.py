@@ -0,0 +1,124 @@
+# timing.py
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+import numpy as np
+
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+HISTORY_SIZE = 1000
+
+_local = threading.local()
+_lock = threading.Lock()
+_history = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+_last = None
+_logger = logging.getLogger("timing")
+_logger.propagate = False
+_profile_dir = None
+_profile_lock = threading.Lock()
+
+
+def configure(log_path=None, profile_dir=None):
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
+    if log_path is not None:
+        handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+    set_profiling(profile_dir)
+
+
+def set_profiling(profile_dir):
+    # None turns profiling off, otherwise every top-level operation leaves a .prof file there
+    global _profile_dir
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+    _profile_dir = profile_dir
+
+
+def profiling():
+    return _profile_dir is not None
+
+
+@contextmanager
+def timed(name):
+    # The outermost timer of a thread is the operation, the timers nested in it are its steps
+    if not hasattr(_local, "depth"):
+        _local.depth = 0
+        _local.steps = {}
+    outer = _local.depth == 0
+    profiler = _start_profiler() if outer else None
+    _local.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.depth -= 1
+        if outer:
+            steps, _local.steps = _local.steps, {}
+            _finish(name, elapsed, steps, profiler)
+        else:
+            _local.steps[name] = _local.steps.get(name, 0.0) + elapsed
+
+
+def _start_profiler():
+    if _profile_dir is None or not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _finish(name, elapsed, steps, profiler):
+    global _last
+    record = {
+        "time": datetime.now().isoformat(timespec="milliseconds"),
+        "operation": name,
+        "total_s": round(elapsed, 6),
+        "steps": {step: round(seconds, 6) for step, seconds in steps.items()},
+        "thread": threading.current_thread().name,
+    }
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+        record["profile"] = os.path.join(_profile_dir, f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+        profiler.dump_stats(record["profile"])
+    with _lock:
+        _history[name].append(elapsed)
+        for step, seconds in steps.items():
+            _history[step].append(seconds)
+        _last = record
+    _logger.info(json.dumps(record))
+
+
+def last_operation():
+    return _last
+
+
+def describe(record):
+    steps = ", ".join(f"{step} {seconds:.3f}s" for step, seconds in sorted(record["steps"].items(), key=lambda item: -item[1]))
+    text = f"{record['operation']} {record['total_s']:.3f}s"
+    return f"{text} ({steps})" if steps else text
+
+
+def summary():
+    with _lock:
+        history = {name: np.array(durations) for name, durations in _history.items()}
+    return {
+        name: {
+            "count": len(durations),
+            "p50_s": round(float(np.percentile(durations, 50)), 6),
+            "p95_s": round(float(np.percentile(durations, 95)), 6),
+        }
+        for name, durations in sorted(history.items())
+    }
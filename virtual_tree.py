@@ -0,0 +1,51 @@
+# virtual_tree.py
+import tkinter as tk
+from tkinter import ttk
+from schema import display_frame
+from timing import timed
+
+PAGE_SIZE = 200
+
+class VirtualTreeview(tk.Frame):
+    def __init__(self, master, columns, page_size=PAGE_SIZE):
+        super().__init__(master)
+        self.columns = columns
+        self.page_size = page_size
+        self._rows = []
+        self._loaded = 0
+
+        self.count_label = tk.Label(self, anchor="w")
+        self.count_label.pack(fill=tk.X)
+
+        body = tk.Frame(self)
+        body.pack(fill=tk.BOTH, expand=True)
+
+        self.tree = ttk.Treeview(body, columns=columns, show='headings')
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=100)
+
+        self.scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    @timed("treeview_fill")
+    def set_rows(self, df):
+        # Convert once to plain values, only the visible page plus a buffer becomes Treeview items
+        self._rows = display_frame(df[self.columns]).to_numpy()
+        self._loaded = 0
+        self.tree.delete(*self.tree.get_children())
+        self.count_label.config(text=f"{len(self._rows)} risultati")
+        self.load_more(2 * self.page_size)
+
+    def load_more(self, count=None):
+        end = min(self._loaded + (count or self.page_size), len(self._rows))
+        for values in self._rows[self._loaded:end].tolist():
+            self.tree.insert("", tk.END, values=values)
+        self._loaded = end
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) > 0.9 and self._loaded < len(self._rows):
+            self.tree.after_idle(self.load_more)